@@ -0,0 +1,85 @@
+"""
+Benchmark the detection execution backends with synthetic clients.
+
+Each client is a coroutine with its own DrowsinessDetector session that pushes
+frames through process_frame back to back, like a driver's WebSocket would.
+Reports aggregate frames/sec for every backend at each concurrency level.
+
+Usage:
+    python bench_backends.py
+    python bench_backends.py --image sample.jpg --clients 1 8 32 --seconds 10
+"""
+import argparse
+import asyncio
+import time
+
+import cv2
+import numpy as np
+
+from detection import DetectorModels
+from detection_backend import BACKENDS, create_backend
+from driver_drowsiness import DrowsinessDetector
+from inference_batcher import InferenceBatcher
+
+
+def synthetic_frame(width=640, height=480):
+    """A face-like test card: gradient background with a head and two eyes"""
+    frame = np.tile(np.linspace(40, 200, width, dtype=np.uint8), (height, 1))
+    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    center = (width // 2, height // 2)
+    cv2.ellipse(frame, center, (width // 8, height // 4), 0, 0, 360, (170, 190, 220), -1)
+    for dx in (-width // 20, width // 20):
+        cv2.circle(frame, (center[0] + dx, center[1] - height // 16), width // 80, (30, 30, 30), -1)
+    return frame
+
+
+async def run_client(detector, frame, deadline):
+    frames = 0
+    while time.perf_counter() < deadline:
+        # process_frame annotates in place, so every call gets a fresh copy
+        await detector.process_frame(frame.copy())
+        frames += 1
+    return frames
+
+
+async def run_level(models, backend, frame, clients, seconds):
+    deadline = time.perf_counter() + seconds
+    # Synthetic drivers must never reach the real SOS pipeline
+    # One batcher for all sessions, as in the server
+    batcher = InferenceBatcher(models.model) if models.model is not None else None
+    sessions = [DrowsinessDetector(models, backend, sos=lambda **_: None, batcher=batcher)
+                for _ in range(clients)]
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(run_client(s, frame, deadline) for s in sessions))
+    elapsed = time.perf_counter() - start
+    return sum(counts) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frames/sec per detection backend")
+    parser.add_argument('--image', help="Frame to replay (defaults to a synthetic test card)")
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--clients', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    frame = cv2.imread(args.image) if args.image else synthetic_frame()
+    if frame is None:
+        parser.error(f"Could not read {args.image}")
+
+    models = DetectorModels()
+    print(f"{'backend':<10}" + ''.join(f"{c:>10} cl" for c in args.clients))
+    for name in args.backends:
+        backend = create_backend(models, name, args.workers)
+        try:
+            # Warm up pools so worker start-up is not billed to the first level
+            asyncio.run(run_level(models, backend, frame, 1, 0.5))
+            rates = [asyncio.run(run_level(models, backend, frame, c, args.seconds)) for c in args.clients]
+        finally:
+            backend.shutdown()
+        print(f"{name:<10}" + ''.join(f"{r:>10.1f}fps" for r in rates))
+
+
+if __name__ == "__main__":
+    main()
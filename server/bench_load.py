@@ -0,0 +1,253 @@
+"""
+WebSocket load generator for /ws/video.
+
+Opens N concurrent driver connections, each streaming a sample clip at a
+fixed frame rate and resolution over the JSON or binary framing, and
+measures what the drivers would see: round-trip latency per answered frame
+(matched by sequence number), frames the server dropped as stale, answers
+that came back later than a deadline, and overall throughput. Repeating this
+for several values of N gives the capacity curve (clients vs p99 latency).
+
+With --serve the server is started on localhost for the run, with SOS
+alerts disabled, so the whole test works offline. The first level starts
+once /health/ready answers, so model loading is not billed to it.
+
+Usage:
+    python bench_load.py --serve --clients 1 4 16 32 --seconds 20
+    python bench_load.py --url ws://10.0.0.5:8000/ws/video --protocol json --response frame
+    python bench_load.py --serve --source drive.mp4 --width 320 --height 240 --fps 10 --slo-ms 250
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import cv2
+import numpy as np
+from websockets.asyncio.client import connect
+
+from bench_replay import read_frames
+from frame_protocol import (PROTOCOL_BINARY, PROTOCOL_JSON, REQUEST_HEADER, RESPONSE_FRAME,
+                            RESPONSE_HEADER, RESPONSE_METADATA)
+
+
+class ClientStats:
+    def __init__(self):
+        self.sent = 0
+        self.answered = 0
+        self.dropped = 0
+        self.late = 0
+        self.unanswered = 0
+        self.hints = 0
+        self.errors = 0
+        self.rtts = []
+
+
+def encode_clip(frames, width, height, quality):
+    """The clip as the JPEG payloads a browser would send"""
+    clip = []
+    for frame in frames:
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        _, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        clip.append(jpeg.tobytes())
+    return clip
+
+
+async def run_client(url, clip, protocol, response, fps, seconds, late_s, stats, offset=0):
+    sent_at = {}
+
+    def answered(seq, now):
+        started = sent_at.pop(seq, None)
+        if started is None:
+            return
+        # Anything older that is still waiting was skipped by latest-frame-wins
+        for old in [s for s in sent_at if s < seq]:
+            del sent_at[old]
+            stats.dropped += 1
+        rtt = now - started
+        stats.answered += 1
+        stats.rtts.append(rtt)
+        if rtt > late_s:
+            stats.late += 1
+
+    async with connect(url, max_size=None) as ws:
+        await ws.send(json.dumps({'type': 'hello', 'protocol': protocol, 'response': response}))
+        json.loads(await ws.recv())
+        payloads = clip if protocol == PROTOCOL_BINARY else [base64.b64encode(j).decode() for j in clip]
+        deadline = time.perf_counter() + seconds
+
+        async def sender():
+            interval = 1.0 / fps
+            next_send = time.perf_counter()
+            seq = 0
+            while time.perf_counter() < deadline:
+                seq += 1
+                payload = payloads[(seq + offset) % len(payloads)]
+                now = time.perf_counter()
+                sent_at[seq] = now
+                if protocol == PROTOCOL_BINARY:
+                    await ws.send(REQUEST_HEADER.pack(seq, now * 1000.0, 0) + payload)
+                else:
+                    await ws.send(json.dumps({'frame': payload, 'seq': seq, 'ts': now * 1000.0}))
+                stats.sent += 1
+                next_send += interval
+                await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+
+        async def receiver():
+            while True:
+                message = await ws.recv()
+                now = time.perf_counter()
+                if isinstance(message, bytes):
+                    seq = RESPONSE_HEADER.unpack_from(message)[0]
+                else:
+                    data = json.loads(message)
+                    if data.get('type') == 'flow':
+                        stats.hints += 1
+                        continue
+                    seq = data.get('seq')
+                answered(seq, now)
+
+        sending = asyncio.create_task(sender())
+        receiving = asyncio.create_task(receiver())
+        try:
+            await sending
+            # Give frames still in flight a moment to come back
+            grace = time.perf_counter() + max(2.0, 2 * late_s)
+            while sent_at and time.perf_counter() < grace and not receiving.done():
+                await asyncio.sleep(0.05)
+        finally:
+            receiving.cancel()
+        stats.unanswered += len(sent_at)
+
+
+async def run_level(args, clip, clients):
+    stats = [ClientStats() for _ in range(clients)]
+
+    async def guarded(i):
+        try:
+            # Stagger starts and clip positions so clients are not in lockstep
+            await asyncio.sleep(i * 0.01)
+            await run_client(args.url, clip, args.protocol, args.response, args.fps, args.seconds,
+                             args.late_ms / 1000.0, stats[i], offset=i * 7)
+        except Exception as e:
+            stats[i].errors += 1
+            print(f"❌ Client {i}: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(guarded(i) for i in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    rtts = np.array([rtt for s in stats for rtt in s.rtts]) * 1000.0
+    sent = sum(s.sent for s in stats)
+    answered = sum(s.answered for s in stats)
+    result = {
+        'clients': clients,
+        'sent': sent,
+        'answered': answered,
+        'throughput_fps': round(answered / elapsed, 2),
+        'dropped_ratio': round(sum(s.dropped for s in stats) / sent, 4) if sent else None,
+        'late_ratio': round(sum(s.late for s in stats) / answered, 4) if answered else None,
+        'unanswered': sum(s.unanswered for s in stats),
+        'flow_hints': sum(s.hints for s in stats),
+        'errors': sum(s.errors for s in stats)
+    }
+    if len(rtts):
+        p50, p95, p99 = np.percentile(rtts, [50, 95, 99])
+        result.update({'p50_ms': round(float(p50), 2), 'p95_ms': round(float(p95), 2),
+                       'p99_ms': round(float(p99), 2), 'max_ms': round(float(rtts.max()), 2)})
+    return result
+
+
+def wait_for_ready(host, port, timeout=120.0):
+    """Poll /health/ready: the port opens before the detector is warm"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://{host}:{port}/health/ready", timeout=1.0) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def start_server(port):
+    """uvicorn on localhost with SOS alerts switched off"""
+    env = dict(os.environ, SOS_ENABLED='0')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'driver_drowsiness:app', '--host', '127.0.0.1',
+         '--port', str(port), '--log-level', 'warning'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+    if not wait_for_ready('127.0.0.1', port):
+        server.terminate()
+        raise SystemExit("❌ Server did not become ready")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent /ws/video clients and the capacity curve")
+    parser.add_argument('--url', default=None, help="Server to test (default: ws://127.0.0.1:<port>/ws/video)")
+    parser.add_argument('--serve', action='store_true', help="Start the server on localhost for the run")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--clients', nargs='+', type=int, default=[1, 4, 16])
+    parser.add_argument('--seconds', type=float, default=10.0, help="Duration of each level")
+    parser.add_argument('--fps', type=float, default=10.0, help="Frames per second per client")
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--jpeg-quality', type=int, default=80)
+    parser.add_argument('--protocol', choices=(PROTOCOL_BINARY, PROTOCOL_JSON), default=PROTOCOL_BINARY)
+    parser.add_argument('--response', choices=(RESPONSE_FRAME, RESPONSE_METADATA), default=RESPONSE_METADATA)
+    parser.add_argument('--source', help="Video file or frame directory for the clip")
+    parser.add_argument('--image', help="Still to pan for the clip when no --source is given")
+    parser.add_argument('--clip-frames', type=int, default=60)
+    parser.add_argument('--late-ms', type=float, default=200.0, help="Answers slower than this count as late")
+    parser.add_argument('--slo-ms', type=float, default=None, help="Report the most clients with p99 under this")
+    parser.add_argument('--output', help="Write the JSON report here")
+    args = parser.parse_args()
+    args.url = args.url or f"ws://127.0.0.1:{args.port}/ws/video"
+
+    clip = encode_clip(read_frames(args.source, args.clip_frames, args.image),
+                       args.width, args.height, args.jpeg_quality)
+    if not clip:
+        parser.error("No frames for the clip")
+
+    server = start_server(args.port) if args.serve else None
+    levels = []
+    try:
+        print(f"{'clients':>8}{'sent/s':>9}{'ans/s':>9}{'drop':>8}{'late':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for clients in args.clients:
+            result = asyncio.run(run_level(args, clip, clients))
+            levels.append(result)
+            print(f"{clients:>8}{result['sent'] / args.seconds:>9.1f}{result['throughput_fps']:>9.1f}"
+                  f"{(result['dropped_ratio'] or 0):>8.1%}{(result['late_ratio'] or 0):>8.1%}"
+                  f"{result.get('p50_ms', float('nan')):>9.1f}{result.get('p95_ms', float('nan')):>9.1f}"
+                  f"{result.get('p99_ms', float('nan')):>9.1f}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    report = {
+        'url': args.url,
+        'config': {k: getattr(args, k) for k in ('fps', 'width', 'height', 'jpeg_quality', 'protocol',
+                                                 'response', 'seconds', 'late_ms')},
+        'levels': levels
+    }
+    if args.slo_ms is not None:
+        within = [level['clients'] for level in levels if level.get('p99_ms', float('inf')) <= args.slo_ms]
+        report['capacity'] = max(within) if within else 0
+        print(f"📈 Capacity at p99 <= {args.slo_ms:.0f} ms: {report['capacity']} clients")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
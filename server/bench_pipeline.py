@@ -0,0 +1,220 @@
+"""
+Headless benchmark of the full frame pipeline on recorded video.
+
+Streams one or more video files or frame directories through the same
+DrowsinessDetector.process_frame path the /ws/video endpoint uses, without a
+webcam, window or sound. Every frame is JPEG-encoded first, as a browser
+would send it, then timed through decode, the detection stages (grayscale,
+detect, landmarks or eyes, EAR, model), annotate and encode.
+
+Reports frames/sec, p50/p95/p99 latency per stage and end to end, peak RSS
+and the drowsy/alert timeline, and writes everything as JSON so runs can be
+compared across backends and commits.
+
+Usage:
+    python bench_pipeline.py drive1.mp4 drive2.mp4 --output results.json
+    python bench_pipeline.py frames/ --backend process --response metadata
+    python bench_pipeline.py --image screenshots/active.png --limit 200 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from bench_replay import read_frames
+from detection import DetectorModels
+from detection_backend import BACKENDS, create_backend
+from driver_drowsiness import DrowsinessDetector
+from face_tracking import FaceTracker
+from frame_protocol import RESPONSE_FRAME, RESPONSE_METADATA
+
+STAGES = ('decode', 'grayscale', 'detect', 'landmarks', 'eyes', 'ear', 'model', 'annotate', 'encode')
+
+
+def percentiles(values):
+    ms = np.asarray(values) * 1000.0
+    if not len(ms):
+        return None
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {'mean_ms': round(float(ms.mean()), 3), 'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3), 'count': len(ms)}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its (pool) children"""
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1.0 if sys.platform == 'darwin' else 1024.0
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return {'self': round(own / 2 ** 20, 1), 'children': round(children / 2 ** 20, 1)}
+
+
+def source_fps(source, default=30.0):
+    if source is None or os.path.isdir(source):
+        return default
+    capture = cv2.VideoCapture(source)
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+    return fps if fps and fps > 0 else default
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Timeline:
+    """Run-length encoded status per frame, with the alarms that fired"""
+
+    def __init__(self, fps):
+        self.fps = fps
+        self.segments = []
+        self.alarms = []
+
+    def add(self, index, status, play_alarm):
+        if play_alarm:
+            self.alarms.append({'frame': index, 'time_s': round(index / self.fps, 3)})
+        if self.segments and self.segments[-1]['status'] == status:
+            self.segments[-1]['end_frame'] = index
+            self.segments[-1]['end_s'] = round(index / self.fps, 3)
+            return
+        self.segments.append({'status': status, 'start_frame': index, 'end_frame': index,
+                              'start_s': round(index / self.fps, 3), 'end_s': round(index / self.fps, 3)})
+
+
+async def run_source(session, frames, response, jpeg_quality, warmup, fps):
+    stages = {stage: [] for stage in STAGES}
+    totals = []
+    timeline = Timeline(fps)
+    started = time.perf_counter()
+    processed = 0
+
+    for index, frame in enumerate(frames):
+        # What a client would put on the wire; not part of the measurement
+        _, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+
+        frame_started = time.perf_counter()
+        image = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+        decoded = time.perf_counter()
+        annotate = response == RESPONSE_FRAME
+        # The recording's own clock, so time-window decisions match real-time playback
+        output, status, play_alarm = await session.process_frame(image, annotate=annotate, timestamp=index / fps)
+        encode_started = time.perf_counter()
+        if annotate:
+            cv2.imencode('.jpg', output)
+        finished = time.perf_counter()
+
+        timeline.add(index, status, play_alarm)
+        processed += 1
+        if index < warmup:
+            continue
+        totals.append(finished - frame_started)
+        stages['decode'].append(decoded - frame_started)
+        for stage, seconds in session.timings.items():
+            stages.setdefault(stage, []).append(seconds)
+        if annotate:
+            stages['encode'].append(finished - encode_started)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'frames': processed,
+        'seconds': round(elapsed, 3),
+        'fps': round(processed / elapsed, 2) if elapsed else None,
+        'latency': percentiles(totals),
+        'stages': {stage: percentiles(values) for stage, values in stages.items() if values},
+        'tracking': session.tracker.stats(),
+        'timeline': timeline.segments,
+        'alarms': timeline.alarms
+    }
+
+
+def print_summary(name, result):
+    latency = result['latency'] or {}
+    print(f"\n▶ {name}: {result['frames']} frames, {result['fps']} fps, "
+          f"p50 {latency.get('p50_ms')} ms, p95 {latency.get('p95_ms')} ms, p99 {latency.get('p99_ms')} ms")
+    for stage, stats in result['stages'].items():
+        print(f"   {stage:<10}{stats['mean_ms']:>9.2f} ms mean{stats['p95_ms']:>9.2f} ms p95")
+    segments = result['timeline']
+    drowsy = sum(s['end_frame'] - s['start_frame'] + 1 for s in segments if s['status'] == 'DROWSY!')
+    print(f"   timeline: {len(segments)} segments, {drowsy} drowsy frames, {len(result['alarms'])} alarms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless per-stage benchmark of process_frame")
+    parser.add_argument('sources', nargs='*', help="Video files or frame directories (default: a panned still)")
+    parser.add_argument('--image', help="Still to pan when no source is given")
+    parser.add_argument('--limit', type=int, default=None, help="Frames per source")
+    parser.add_argument('--backend', choices=BACKENDS, default='inline')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--response', choices=(RESPONSE_FRAME, RESPONSE_METADATA), default=RESPONSE_FRAME,
+                        help="'frame' annotates and re-encodes like the default page, 'metadata' skips both")
+    parser.add_argument('--detect-every', type=int, default=None, help="Override DETECT_EVERY")
+    parser.add_argument('--jpeg-quality', type=int, default=80)
+    parser.add_argument('--warmup', type=int, default=5, help="Leading frames left out of the statistics")
+    parser.add_argument('--fps', type=float, default=None, help="Timeline frame rate (default: from the video)")
+    parser.add_argument('--output', help="Write the JSON report here")
+    parser.add_argument('--json', action='store_true', help="Print the JSON report instead of a summary")
+    args = parser.parse_args()
+
+    models = DetectorModels()
+    backend = create_backend(models, args.backend, args.workers)
+    report = {
+        'created': datetime.now().isoformat(),
+        'git': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'config': {
+            'backend': backend.name,
+            'workers': backend.workers,
+            'response': args.response,
+            'detect_every': args.detect_every or int(os.getenv('DETECT_EVERY', '5')),
+            'detect_scale': models.detect_scale,
+            'landmarks': models.use_advanced,
+            'model': models.model is not None
+        },
+        'sources': {}
+    }
+
+    try:
+        for source in args.sources or [None]:
+            name = source or (args.image or 'synthetic')
+            # A fresh session per source, so drowsy state does not leak between recordings
+            session = DrowsinessDetector(models, backend, sos=lambda **_: None,
+                                         tracker=FaceTracker(detect_every=args.detect_every))
+            frames = read_frames(source, args.limit, args.image)
+            fps = args.fps or source_fps(source)
+            result = asyncio.run(run_source(session, frames, args.response, args.jpeg_quality,
+                                            args.warmup, fps))
+            report['sources'][name] = result
+            if not args.json:
+                print_summary(name, result)
+    finally:
+        backend.shutdown()
+
+    report['peak_rss_mb'] = peak_rss_mb()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"\nPeak RSS: {report['peak_rss_mb']['self']} MB (children {report['peak_rss_mb']['children']} MB)")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        if not args.json:
+            print(f"📄 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
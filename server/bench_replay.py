@@ -0,0 +1,221 @@
+"""
+Replay a recording through one detection session and time every frame.
+
+Frames come from a video file, a directory of images, or a still image (by
+default a synthetic test card) panned slowly so the face drifts like a head
+in a cab. Each configuration replays the same frames on the inline backend,
+so the numbers are per-frame latency of the detection stage without any pool
+in the way.
+
+Three comparisons are printed: face tracking intervals (DETECT_EVERY),
+detection scales (DETECT_SCALE) and Haar cascade profiles (CASCADE_PROFILE).
+For the scales, every frame gets a full detection and its eye state is
+compared with the full-resolution run: EAR difference and open/closed
+agreement with landmarks, eye-count agreement with the Haar eye cascade.
+The profiles always run the OpenCV fallback (Haar face and eyes, as on a
+server without dlib) and report CPU per frame and per eye search against
+the first profile, 'legacy' (whole-face search) by default.
+
+Usage:
+    python bench_replay.py
+    python bench_replay.py --source drive.mp4 --detect-every 1 5 10
+    python bench_replay.py --source frames/ --limit 300
+    python bench_replay.py --image screenshots/active.png --scales 1 2 4
+    python bench_replay.py --source drive.mp4 --profiles legacy balanced fast
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import cv2
+import numpy as np
+
+from bench_backends import synthetic_frame
+from detection import CASCADE_PROFILES, EYES_CLOSED_EAR, DetectorModels
+from detection_backend import InlineBackend
+from driver_drowsiness import DrowsinessDetector
+from face_tracking import FaceTracker
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def panned_clip(card, count=300):
+    """`card` panned a few pixels per frame like a head in a cab"""
+    height, width = card.shape[:2]
+    for i in range(count):
+        dx = int(40 * np.sin(i / 30.0))
+        dy = int(15 * np.sin(i / 17.0))
+        matrix = np.float32([[1, 0, dx], [0, 1, dy]])
+        yield cv2.warpAffine(card, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+
+
+def read_frames(source, limit=None, image=None):
+    """Yield BGR frames from a video file, an image directory or a panned still"""
+    if source is None:
+        card = cv2.imread(image) if image else synthetic_frame()
+        if card is None:
+            raise SystemExit(f"Could not read {image}")
+        frames = panned_clip(card, limit or 300)
+    elif os.path.isdir(source):
+        names = sorted(n for n in os.listdir(source) if n.lower().endswith(IMAGE_EXTENSIONS))
+        frames = (cv2.imread(os.path.join(source, n)) for n in names)
+    else:
+        frames = _video_frames(source)
+
+    for i, frame in enumerate(frames):
+        if limit is not None and i >= limit:
+            break
+        if frame is not None:
+            yield frame
+
+
+def _video_frames(path):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise SystemExit(f"Could not open {path}")
+    try:
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        capture.release()
+
+
+def eye_state(faces):
+    """(EAR, eyes closed) of the driver (always the first face), or None when no face was found"""
+    if not faces:
+        return None
+    face = faces[0]
+    if 'ear' in face:
+        return face['ear'], face['ear'] < EYES_CLOSED_EAR
+    return None, face['eyes_count'] < 2
+
+
+async def replay(session, frames, stages=None):
+    """
+    Per-frame wall times and CPU times in seconds, and the eye state of every frame.
+
+    Pass a list as `stages` to also collect each frame's stage timings and faces.
+    """
+    timings, cpu, states = [], [], []
+    for frame in frames:
+        started, cpu_started = time.perf_counter(), time.process_time()
+        await session.process_frame(frame.copy(), annotate=False)
+        timings.append(time.perf_counter() - started)
+        cpu.append(time.process_time() - cpu_started)
+        states.append(eye_state(session.faces))
+        if stages is not None:
+            stages.append((dict(session.timings), session.faces))
+    return timings, cpu, states
+
+
+def summarize(timings):
+    ms = np.array(timings) * 1000.0
+    return {
+        'frames': len(ms),
+        'mean_ms': float(ms.mean()) if len(ms) else 0.0,
+        'p95_ms': float(np.percentile(ms, 95)) if len(ms) else 0.0
+    }
+
+
+def agreement(states, reference):
+    """Face-found agreement, eye-state agreement and mean EAR difference versus `reference`"""
+    found = [(s is None) == (r is None) for s, r in zip(states, reference)]
+    both = [(s, r) for s, r in zip(states, reference) if s is not None and r is not None]
+    same = [s[1] == r[1] for s, r in both]
+    ear_diff = [abs(s[0] - r[0]) for s, r in both if s[0] is not None and r[0] is not None]
+    return {
+        'face_agree': float(np.mean(found)) if found else 0.0,
+        'eyes_agree': float(np.mean(same)) if same else 0.0,
+        'ear_diff': float(np.mean(ear_diff)) if ear_diff else None
+    }
+
+
+def compare_tracking(models, backend, frames, intervals):
+    print(f"{'detect_every':>12}{'mean ms':>10}{'p95 ms':>10}{'skip':>8}{'speedup':>9}")
+    baseline = None
+    for every in intervals:
+        session = DrowsinessDetector(models, backend, sos=lambda **_: None,
+                                     tracker=FaceTracker(detect_every=every))
+        timings, _, _ = asyncio.run(replay(session, frames))
+        summary = summarize(timings)
+        baseline = baseline or summary['mean_ms']
+        print(f"{every:>12}{summary['mean_ms']:>10.2f}{summary['p95_ms']:>10.2f}"
+              f"{session.tracker.skip_ratio():>8.0%}{baseline / summary['mean_ms']:>8.2f}x")
+
+
+def compare_scales(models, backend, frames, scales):
+    height = frames[0].shape[0]
+    print(f"{'scale':>6}{'used':>6}{'cpu ms':>9}{'mean ms':>10}{'faces':>8}{'eyes':>8}{'dEAR':>8}")
+    configured = models.detect_scale
+    reference = None
+    try:
+        for scale in scales:
+            models.detect_scale = scale
+            # Full detection on every frame, so the scale is all that differs
+            session = DrowsinessDetector(models, backend, sos=lambda **_: None,
+                                         tracker=FaceTracker(detect_every=1))
+            timings, cpu, states = asyncio.run(replay(session, frames))
+            reference = reference or states
+            match = agreement(states, reference)
+            ear_diff = '-' if match['ear_diff'] is None else f"{match['ear_diff']:.3f}"
+            print(f"{scale:>6g}{models.detection_scale(height):>6.2g}{np.mean(cpu) * 1000:>9.2f}"
+                  f"{summarize(timings)['mean_ms']:>10.2f}{match['face_agree']:>8.0%}"
+                  f"{match['eyes_agree']:>8.0%}{ear_diff:>8}")
+    finally:
+        models.detect_scale = configured
+
+
+def compare_profiles(frames, profiles):
+    print(f"{'profile':>10}{'cpu ms':>9}{'eyes ms':>9}{'reused':>8}{'faces':>8}{'eyes':>8}{'speedup':>9}")
+    reference = baseline = None
+    for profile in profiles:
+        models = DetectorModels(cascade_profile=profile, use_dlib=False)
+        session = DrowsinessDetector(models, InlineBackend(models), sos=lambda **_: None)
+        stages = []
+        _, cpu, states = asyncio.run(replay(session, frames, stages))
+        reference = reference or states
+        match = agreement(states, reference)
+        eyes_ms = [timings['eyes'] * 1000 for timings, faces in stages if faces and 'eyes' in timings]
+        reused = [faces[0].get('eyes_reused', False) for _, faces in stages if faces]
+        cpu_ms = np.mean(cpu) * 1000
+        baseline = baseline or cpu_ms
+        print(f"{profile:>10}{cpu_ms:>9.2f}{np.mean(eyes_ms) if eyes_ms else 0:>9.2f}"
+              f"{np.mean(reused) if reused else 0:>8.0%}{match['face_agree']:>8.0%}"
+              f"{match['eyes_agree']:>8.0%}{baseline / cpu_ms:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame detection latency on a replayed clip")
+    parser.add_argument('--source', help="Video file or directory of frames (defaults to a synthetic clip)")
+    parser.add_argument('--image', help="Still to pan when no --source is given")
+    parser.add_argument('--limit', type=int, default=None, help="Replay at most this many frames")
+    parser.add_argument('--detect-every', nargs='*', type=int, default=[1, 5, 10],
+                        help="Full-detection intervals to compare (1 = detect every frame, none to skip)")
+    parser.add_argument('--scales', nargs='*', type=float, default=[1, 2, 4],
+                        help="Detection scales to compare; the first one is the reference")
+    parser.add_argument('--profiles', nargs='*', choices=tuple(CASCADE_PROFILES),
+                        default=['legacy', 'balanced', 'fast'],
+                        help="Haar cascade profiles to compare on the fallback path; the first one is the reference")
+    args = parser.parse_args()
+
+    frames = list(read_frames(args.source, args.limit, args.image))
+    if not frames:
+        parser.error("No frames to replay")
+
+    models = DetectorModels()
+    backend = InlineBackend(models)
+    print(f"{len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}")
+    if args.detect_every:
+        compare_tracking(models, backend, frames, args.detect_every)
+    if args.scales:
+        compare_scales(models, backend, frames, args.scales)
+    if args.profiles:
+        compare_profiles(frames, args.profiles)
+
+
+if __name__ == "__main__":
+    main()
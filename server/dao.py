@@ -1,85 +1,24 @@
-from pocketbase import PocketBase
-from datetime import datetime
-import pandas as pd
-import json
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
-import os
-from geopy.geocoders import Nominatim
-import geocoder
 from local_storage import local_store
+from location import location_provider
+from pb_client import client_manager
 
 def get_current_location():
-    try:
-        print("🌍 Getting location via IP...")
-        g = geocoder.ip('me')
-        print(f"📍 IP Location: {g.latlng}")
-        
-        if g.latlng and len(g.latlng) >= 2:
-            try:
-                geolocator = Nominatim(user_agent="drowsiness_detector")
-                location = geolocator.reverse(f"{g.latlng[0]}, {g.latlng[1]}")
-                address = location.address if location else 'Unknown location'
-            except Exception as e:
-                print(f"⚠️ Geocoding failed: {e}")
-                address = 'Unknown location'
-            
-            return {
-                'latitude': g.latlng[0],
-                'longitude': g.latlng[1],
-                'address': address
-            }
-        else:
-            # Fallback to default location if IP location fails
-            print("⚠️ IP location failed, using default location")
-            return {
-                'latitude': 40.7128,  # NYC coordinates as fallback
-                'longitude': -74.0060,
-                'address': 'Location unavailable'
-            }
-    except Exception as e:
-        print(f"❌ Location service error: {e}")
-        return {
-            'latitude': 40.7128,  # NYC coordinates as fallback
-            'longitude': -74.0060,
-            'address': 'Location unavailable'
-        }
+    """Server position and address; cached, see location.LocationProvider"""
+    return location_provider.current_location()
 
 load_dotenv()
 
 def connect():
-    pb_url = os.getenv('POCKETBASE_URL')
-    print(f"🔗 Connecting to PocketBase: {pb_url}")
-    pb = PocketBase(pb_url)
-    
-    # Try admin authentication first
-    admin_email = os.getenv('POCKETBASE_ADMIN_EMAIL')
-    admin_password = os.getenv('POCKETBASE_ADMIN_PASSWORD')
-    
-    if admin_email and admin_password:
-        try:
-            pb.admins.auth_with_password(admin_email, admin_password)
-            print("✅ Admin authenticated successfully")
-            return pb
-        except Exception as e:
-            print(f"⚠️  Admin authentication failed: {e}")
-    
-    # If admin auth fails, try regular user auth (if it's also a regular user)
-    if admin_email and admin_password:
-        try:
-            pb.collection('users').auth_with_password(admin_email, admin_password)
-            print("✅ User authenticated successfully")
-            return pb
-        except Exception as e:
-            print(f"⚠️  User authentication failed: {e}")
-    
-    print("⚠️  No authentication successful, proceeding without auth")
-    return pb
+    """Return the process-wide PocketBase client, authenticated and ready to use"""
+    return client_manager.client()
 
 
 
 def check():
     print(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-    var = (datetime.now() + pd.DateOffset(hours=8)).strftime('%Y-%m-%d %H:%M:%S')
+    var = (datetime.now() + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S')
     print(var)
 
     pb = connect()
@@ -90,6 +29,8 @@ def check():
     except Exception as e:
         print(f"Error fetching SOS records: {e}")
 
+    print(f"🔑 PocketBase client stats: {client_manager.stats()}")
+
 def raise_sos(location_data=None):
     try:
         print("🚨 Raising SOS alert...")
@@ -188,6 +129,36 @@ def raise_sos(location_data=None):
         traceback.print_exc()
         return False
 
+def deliver_sos_batch(records):
+    """
+    Deliver queued SOS alerts over one PocketBase connection.
+
+    `records` is a list of (idempotency_key, sos_data). The key is used as the
+    record id, so an alert whose earlier attempt did reach PocketBase is
+    recognised instead of duplicated. Returns {key: None on success, else error}.
+    """
+    pb = connect()
+    results = {}
+    for key, sos_data in records:
+        # createdtime only exists in the local schema
+        record = {k: v for k, v in sos_data.items() if k != 'createdtime'}
+        record['id'] = key
+        try:
+            pb.collection('sos_alerts').create(record)
+            results[key] = None
+        except Exception as create_error:
+            try:
+                pb.collection('sos_alerts').get_one(key)
+                results[key] = None  # Delivered by an earlier attempt
+            except Exception:
+                results[key] = str(create_error)
+    return results
+
+def update_sos_address(sid, address):
+    """Fill in the address of an already stored SOS alert"""
+    pb = connect()
+    pb.collection('sos_alerts').update(sid, {'address': address})
+
 def sos_details(sid=None):
     try:
         pb = connect()
@@ -267,7 +238,7 @@ def login(pid, taxi, password):
                     'taxiid': taxi_doc.id,
                     'userid': pid,
                     'starttime': datetime.now().isoformat(),
-                    'endtime': (datetime.now() + pd.DateOffset(hours=8)).isoformat()
+                    'endtime': (datetime.now() + timedelta(hours=8)).isoformat()
                 }
                 pb.collection('sessions').create(session_data)
                 return True
@@ -0,0 +1,257 @@
+"""
+Parallel, cached feature extraction for training.
+
+Building the training set used to run HOG detection, the landmark predictor
+and a histogram on every image, one after another on one core, on every
+training run. build_dataset() spreads the images over a process pool whose
+workers each load the dlib models once, and keeps every image's feature
+vector in an on-disk cache keyed by the SHA-1 of the file's content, so a
+re-run only processes images that are new or changed.
+
+The result is written as two memory-mappable arrays next to the cache:
+features.npy (N, FEATURE_LENGTH) float32 and labels.npy (N,) int8.
+
+For corpora too large to hold in memory, fit_scaler() and stream_batches()
+read that table chunk by chunk through the memory map and feed model.fit
+from a generator, so peak memory does not grow with the dataset.
+
+This module deliberately does not import TensorFlow, so pool workers start
+quickly on spawn-based platforms.
+"""
+import hashlib
+import os
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+from features import FEATURE_LENGTH, FEATURE_VERSION, feature_vectors, landmarks_array
+
+CLASSES = (('Drowsy', 1), ('Non Drowsy', 0))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+PREDICTOR_PATH = "shape_predictor_68_face_landmarks.dat"
+
+# dlib models of a pool worker, loaded once by _init_worker
+_detector = None
+_predictor = None
+
+
+def _init_worker(predictor_path):
+    global _detector, _predictor
+    import dlib
+    _detector = dlib.get_frontal_face_detector()
+    _predictor = dlib.shape_predictor(predictor_path)
+
+
+def extract_image_features(detector, predictor, image_path):
+    """Feature vector of the first face in an image, or None if there is no face"""
+    img = cv2.imread(image_path)
+    if img is None:
+        return None
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    faces = detector(gray)
+    if len(faces) == 0:
+        return None
+    points = landmarks_array(predictor(gray, faces[0]))
+    return feature_vectors(points, gray)[0]
+
+
+def file_digest(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class FeatureCache:
+    """One .npy per image content hash; an empty array records 'no face found'"""
+
+    def __init__(self, cache_dir):
+        # Features from an older kernel live in another directory and are never mixed in
+        self.root = os.path.join(cache_dir, f"v{FEATURE_VERSION}")
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], f"{digest}.npy")
+
+    def get(self, digest):
+        """(hit, features or None)"""
+        try:
+            features = np.load(self.path(digest))
+        except (OSError, ValueError):
+            return False, None
+        return True, (features if features.size else None)
+
+    def put(self, digest, features):
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.empty(0, np.float32) if features is None else features.astype(np.float32))
+        os.replace(tmp_path, path)
+
+
+def _extract_and_cache(job):
+    """Pool task: extract one image and store the result in the cache"""
+    image_path, digest, cache_dir = job
+    try:
+        features = extract_image_features(_detector, _predictor, image_path)
+    except Exception as e:
+        print(f"Error processing {image_path}: {str(e)}")
+        return digest, False
+    FeatureCache(cache_dir).put(digest, features)
+    return digest, features is not None
+
+
+def list_images(dataset_dir):
+    """(path, label) for every image under the class directories, in a stable order"""
+    images = []
+    for class_name, label in CLASSES:
+        class_dir = os.path.join(dataset_dir, class_name)
+        for img_name in sorted(os.listdir(class_dir)):
+            if img_name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((os.path.join(class_dir, img_name), label))
+    return images
+
+
+def build_dataset(dataset_dir, cache_dir=None, workers=None, predictor_path=PREDICTOR_PATH):
+    """
+    Extract (or reuse) the features of every image and write features.npy/labels.npy.
+
+    Returns (features_path, labels_path); open them with np.load(path, mmap_mode='r').
+    """
+    cache_dir = cache_dir or os.path.join(dataset_dir, '.feature_cache')
+    workers = workers or os.cpu_count() or 1
+    cache = FeatureCache(cache_dir)
+    started = time.perf_counter()
+
+    images = list_images(dataset_dir)
+    digests = [file_digest(path) for path, _ in images]
+    # digest -> whether the image has a face; the vectors themselves stay on disk
+    has_face = {}
+    jobs = []
+    for (path, _), digest in zip(images, digests):
+        if digest in has_face:
+            continue  # Same image twice
+        hit, features = cache.get(digest)
+        has_face[digest] = features is not None
+        if not hit:
+            jobs.append((path, digest, cache_dir))
+    print(f"📦 {len(images)} images, {len(images) - len(jobs)} cached, {len(jobs)} to extract "
+          f"with {workers} worker(s)")
+
+    if jobs:
+        if workers == 1:
+            _init_worker(predictor_path)
+            done = map(_extract_and_cache, jobs)
+        else:
+            pool = Pool(workers, initializer=_init_worker, initargs=(predictor_path,))
+            done = pool.imap_unordered(_extract_and_cache, jobs, chunksize=8)
+        try:
+            for i, (digest, found) in enumerate(done, 1):
+                has_face[digest] = found
+                if i % 500 == 0:
+                    print(f"   {i}/{len(jobs)} extracted")
+        finally:
+            if workers != 1:
+                pool.close()
+                pool.join()
+
+    # Stream the table out row by row; only one row is ever held here
+    rows = [(digest, label) for (_, label), digest in zip(images, digests) if has_face[digest]]
+    root = os.path.dirname(cache.root)
+    features_path = os.path.join(root, 'features.npy')
+    labels_path = os.path.join(root, 'labels.npy')
+    table = np.lib.format.open_memmap(features_path, mode='w+', dtype=np.float32,
+                                      shape=(len(rows), FEATURE_LENGTH))
+    labels = np.lib.format.open_memmap(labels_path, mode='w+', dtype=np.int8, shape=(len(rows),))
+    for i, (digest, label) in enumerate(rows):
+        table[i] = cache.get(digest)[1]
+        labels[i] = label
+    table.flush()
+    labels.flush()
+    del table, labels
+
+    print(f"✅ Dataset built in {time.perf_counter() - started:.1f}s: {len(rows)} samples "
+          f"({len(images) - len(rows)} without a face) -> {features_path}")
+    return features_path, labels_path
+
+
+def iter_chunks(features_path, indices=None, chunk_rows=8192):
+    """Yield float64 blocks of the feature table read through a memory map"""
+    table = np.load(features_path, mmap_mode='r')
+    if indices is None:
+        for start in range(0, len(table), chunk_rows):
+            yield np.asarray(table[start:start + chunk_rows], dtype=np.float64)
+        return
+    indices = np.sort(indices)
+    for start in range(0, len(indices), chunk_rows):
+        yield np.asarray(table[indices[start:start + chunk_rows]], dtype=np.float64)
+
+
+def fit_scaler(scaler, features_path, indices=None, chunk_rows=8192):
+    """Fit a StandardScaler chunk by chunk with partial_fit, never loading the whole table"""
+    for chunk in iter_chunks(features_path, indices, chunk_rows):
+        scaler.partial_fit(chunk)
+    return scaler
+
+
+def stream_batches(features_path, labels_path, indices, scaler, batch_size=32,
+                   augment=True, balance=True, noise=0.01, seed=None):
+    """
+    Endless (X, y) batches for model.fit, read from the memory-mapped table.
+
+    With `balance` every batch is half drowsy and half alert samples, drawn
+    from per-class permutations that are reshuffled whenever they run out.
+    With `augment` drowsy rows get Gaussian noise before scaling, like the
+    extra noisy copies the in-memory path adds. Only one batch is ever held
+    in memory.
+    """
+    table = np.load(features_path, mmap_mode='r')
+    labels = np.load(labels_path, mmap_mode='r')
+    rng = np.random.default_rng(seed)
+    indices = np.asarray(indices)
+    if balance:
+        pools = [indices[labels[indices] == label] for label in (0, 1)]
+        pools = [pool for pool in pools if len(pool)]
+    else:
+        pools = [indices]
+    orders = [rng.permutation(pool) for pool in pools]
+    positions = [0] * len(pools)
+
+    def take(k, count):
+        taken = []
+        while count:
+            if positions[k] == len(orders[k]):
+                orders[k] = rng.permutation(pools[k])
+                positions[k] = 0
+            part = orders[k][positions[k]:positions[k] + count]
+            positions[k] += len(part)
+            count -= len(part)
+            taken.append(part)
+        return np.concatenate(taken)
+
+    while True:
+        shares = [batch_size // len(pools)] * len(pools)
+        shares[0] += batch_size - sum(shares)
+        # Sorted reads keep the memory map access mostly sequential
+        batch = np.sort(np.concatenate([take(k, share) for k, share in enumerate(shares)]))
+        X = np.asarray(table[batch], dtype=np.float64)
+        y = np.asarray(labels[batch], dtype=np.float32)
+        if augment:
+            drowsy = y == 1
+            X[drowsy] += rng.normal(0, noise, (int(drowsy.sum()), X.shape[1]))
+        yield scaler.transform(X), y
+
+
+def stream_eval_batches(features_path, labels_path, indices, scaler, batch_size=256):
+    """Endless passes over `indices` in order, unaugmented, for validation_data"""
+    table = np.load(features_path, mmap_mode='r')
+    labels = np.load(labels_path, mmap_mode='r')
+    indices = np.sort(np.asarray(indices))
+    while True:
+        for start in range(0, len(indices), batch_size):
+            batch = indices[start:start + batch_size]
+            yield (scaler.transform(np.asarray(table[batch], dtype=np.float64)),
+                   np.asarray(labels[batch], dtype=np.float32))
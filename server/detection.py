@@ -0,0 +1,311 @@
+"""
+Stateless face and eye analysis for the drowsiness server.
+
+Everything in here only reads the shared DetectorModels, so it can run on the
+event loop, in a thread pool or inside a process-pool worker.
+"""
+import os
+import time
+from collections import namedtuple
+
+import cv2
+
+from drowsiness_model import load_model
+from face_tracking import box_iou, select_driver
+from features import FEATURE_LENGTH, LEFT_EYE, RIGHT_EYE, compute_features, feature_vectors, landmarks_array
+
+# Try to import dlib, fallback to OpenCV if not available (for Railway deployment)
+try:
+    import dlib
+    DLIB_AVAILABLE = True
+    print("✅ dlib loaded successfully")
+except ImportError:
+    DLIB_AVAILABLE = False
+    print("⚠️  dlib not available, using OpenCV fallback")
+
+
+# detectMultiScale settings of the OpenCV fallback (Haar face + Haar eyes).
+# The eye search covers rows band_top..band_bottom of the face box, accepts
+# eyes between min_eye and max_eye of the face width (0 = no bound), can
+# equalize the region first, and for up to reuse_frames frames only looks
+# around the previous eye boxes while the face stays put. 'legacy' is the old
+# whole-face search, kept for comparisons (bench_replay.py --profiles).
+CascadeProfile = namedtuple('CascadeProfile', 'face_scale eye_scale eye_neighbors band_top band_bottom '
+                                              'min_eye max_eye equalize reuse_frames')
+CASCADE_PROFILES = {
+    'legacy': CascadeProfile(1.3, 1.1, 5, 0.0, 1.0, 0.0, 0.0, False, 0),
+    'accurate': CascadeProfile(1.2, 1.05, 5, 0.15, 0.6, 0.12, 0.45, True, 2),
+    'balanced': CascadeProfile(1.3, 1.1, 5, 0.15, 0.6, 0.15, 0.4, True, 3),
+    'fast': CascadeProfile(1.4, 1.2, 4, 0.2, 0.55, 0.15, 0.35, True, 5),
+}
+
+
+class DetectorModels:
+    """Read-only detection resources, loaded once and shared by every session"""
+
+    # Smallest face each detector can find, in pixels of the image it searches
+    DLIB_WINDOW = 80
+    HAAR_WINDOW = 24
+
+    def __init__(self, predictor_path="shape_predictor_68_face_landmarks.dat",
+                 detect_scale=None, min_face=None, max_face=None, cascade_profile=None, use_dlib=None):
+        self.detector = None
+        self.predictor = None
+        self.face_cascade = None
+        self.eye_cascade = None
+
+        # Initialize based on available libraries
+        if use_dlib is None:
+            use_dlib = DLIB_AVAILABLE
+        if use_dlib:
+            self.detector = dlib.get_frontal_face_detector()
+            if os.path.exists(predictor_path):
+                self.predictor = dlib.shape_predictor(predictor_path)
+                print("✅ Using dlib with facial landmarks")
+            else:
+                print("⚠️  Landmark file not found, using basic dlib")
+        else:
+            # Fallback to OpenCV
+            self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+            print("✅ Using OpenCV cascades")
+
+        # The eye cascade backs every path that has no landmark predictor
+        if self.predictor is None:
+            self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+
+        # The trained MLP, exported for NumPy (export_model.py); it scores the
+        # landmark feature vector, so it is only useful with the predictor
+        self.model = load_model() if self.predictor is not None else None
+        if self.model is not None and self.model.input_size != FEATURE_LENGTH:
+            print(f"⚠️  Drowsiness model expects {self.model.input_size} features, "
+                  f"not {FEATURE_LENGTH}; ignoring it")
+            self.model = None
+
+        # Faces are searched for on the frame shrunk by this factor (1, 2, 4...);
+        # landmarks and eyes are still measured on the full-resolution face
+        self.detect_scale = detect_scale or float(os.getenv('DETECT_SCALE', '2'))
+        # A cab camera sees the driver's face at a fairly fixed distance: its
+        # height as a fraction of the frame height stays within these bounds
+        self.min_face = min_face or float(os.getenv('MIN_FACE_FRACTION', '0.15'))
+        self.max_face = max_face or float(os.getenv('MAX_FACE_FRACTION', '0.9'))
+
+        profile = cascade_profile or os.getenv('CASCADE_PROFILE', 'balanced')
+        if profile not in CASCADE_PROFILES:
+            raise ValueError(f"Unknown cascade profile '{profile}', expected one of {tuple(CASCADE_PROFILES)}")
+        self.cascade_profile = profile
+        self.cascade = CASCADE_PROFILES[profile]
+
+    @property
+    def use_advanced(self):
+        return self.predictor is not None
+
+    @property
+    def detector_window(self):
+        return self.DLIB_WINDOW if self.detector is not None else self.HAAR_WINDOW
+
+    def face_size_bounds(self, frame_height):
+        """Smallest and largest plausible face height in full-resolution pixels"""
+        return int(self.min_face * frame_height), int(self.max_face * frame_height)
+
+    def detection_scale(self, frame_height):
+        """
+        detect_scale, reduced where it would shrink the smallest face below the detector window.
+
+        With dlib's 80 px window and the default MIN_FACE_FRACTION of 0.15 this
+        is 1 (no downscaling) up to 533 px frames, so a 480p camera is searched
+        at full size; 720p gets 1.35 and 1080p the full 2. The Haar cascade's
+        24 px window allows the full scale at 480p. A closer camera can raise
+        MIN_FACE_FRACTION (0.34 gives dlib 2x at 480p).
+        """
+        min_px, _ = self.face_size_bounds(frame_height)
+        return max(1.0, min(self.detect_scale, min_px / float(self.detector_window)))
+
+
+# Average EAR below which the eyes count as closed
+EYES_CLOSED_EAR = 0.25
+
+
+# Smallest eye the Haar eye cascade can find, in pixels
+EYE_WINDOW = 20
+# Below this overlap with the face box the previous eyes were found in, the
+# face moved too much for their positions to be worth reusing
+EYE_REUSE_IOU = 0.8
+# Two reuse windows can overlap; a box overlapping an eye another window
+# already took this much is that same eye, not the other one
+EYE_DUPLICATE_IOU = 0.3
+
+
+def _find_eyes(models, gray, region, face_width):
+    """Eye boxes inside `region` (x, y, w, h) of `gray`, in frame coordinates"""
+    profile = models.cascade
+    rx, ry, rw, rh = region
+    roi = gray[ry:ry+rh, rx:rx+rw]
+    if roi.size == 0:
+        return []
+    if profile.equalize:
+        # Cab lighting changes all the time; the eye cascade wants contrast
+        roi = cv2.equalizeHist(roi)
+    bounds = {}
+    if profile.min_eye:
+        min_size = max(EYE_WINDOW, int(face_width * profile.min_eye))
+        max_size = max(min_size, int(face_width * profile.max_eye))
+        bounds = {'minSize': (min_size, min_size), 'maxSize': (max_size, max_size)}
+    eyes = models.eye_cascade.detectMultiScale(roi, profile.eye_scale, profile.eye_neighbors, **bounds)
+    return [(int(ex) + rx, int(ey) + ry, int(ew), int(eh)) for (ex, ey, ew, eh) in eyes]
+
+
+def detect_eyes(models, gray, face_rect, previous=None):
+    """
+    Eye boxes of one face and whether the previous ones were reused.
+
+    The cascade only searches the band of the face where eyes can be. With
+    `previous` = (face box, eye boxes, times reused) from an earlier frame
+    and a face that has hardly moved, it first searches small windows around
+    those eyes only, as long as they have been reused fewer than the
+    profile's reuse_frames times in a row. Each window keeps the match closest
+    to its previous eye that no other window took, so one eye never counts
+    twice. The whole band is searched again as soon as that finds fewer eyes,
+    so a closure is never hidden by the reuse.
+    """
+    profile = models.cascade
+    x, y, w, h = face_rect
+    if previous is not None and profile.reuse_frames:
+        previous_face, previous_eyes, reused = previous
+        if (previous_eyes and reused < profile.reuse_frames and
+                box_iou(face_rect, previous_face) >= EYE_REUSE_IOU):
+            found = []
+            for ex, ey, ew, eh in previous_eyes:
+                dx, dy = ew // 2, eh // 2
+                x0, y0 = max(0, ex - dx), max(0, ey - dy)
+                x1, y1 = min(gray.shape[1], ex + ew + dx), min(gray.shape[0], ey + eh + dy)
+                candidates = [eye for eye in _find_eyes(models, gray, (x0, y0, x1 - x0, y1 - y0), w)
+                              if all(box_iou(eye, other) < EYE_DUPLICATE_IOU for other in found)]
+                if candidates:
+                    found.append(min(candidates, key=lambda eye: abs(eye[0] - ex) + abs(eye[1] - ey)))
+            if len(found) >= len(previous_eyes):
+                return found, True
+
+    top, bottom = int(h * profile.band_top), int(h * profile.band_bottom)
+    return _find_eyes(models, gray, (x, y + top, w, bottom - top), w), False
+
+
+def simple_eye_detection(models, gray, face_rect):
+    """Simple eye detection using OpenCV cascades"""
+    return len(detect_eyes(models, gray, face_rect)[0])
+
+
+# Width an ROI search is scaled down to; with the tracker's margin the face
+# ends up around half of it, comfortably above the detectors' minimum size
+ROI_SIZE = 240
+
+# Faces kept per frame, largest first; only the driver's get landmarks or eyes
+MAX_FACES = int(os.getenv('MAX_FACES', '6'))
+
+
+def detect_faces(models, gray, roi=None):
+    """
+    Face boxes (x, y, w, h) in full-frame coordinates.
+
+    The search runs on a copy of the frame shrunk by the models' detection
+    scale and only accepts faces within the cab-geometry size bounds. With
+    `roi` = (x, y, w, h) only that part of the frame is searched, which is
+    much cheaper than a full-frame pass when the face barely moved.
+    """
+    min_px, max_px = models.face_size_bounds(gray.shape[0])
+    ox, oy = 0, 0
+    # Full-frame search needs strong evidence; around a known face less will do
+    min_neighbors = 5
+    if roi is not None:
+        ox, oy, rw, rh = roi
+        gray = gray[oy:oy+rh, ox:ox+rw]
+        min_neighbors = 3
+        # Shrink the ROI so the face inside it always has about the same size:
+        # cheaper, and the detector sees the same scale on every frame
+        scale = max(1.0, rw / float(ROI_SIZE))
+    else:
+        scale = models.detection_scale(gray.shape[0])
+
+    if scale > 1.0:
+        height, width = gray.shape[:2]
+        gray = cv2.resize(gray, (max(1, int(width / scale)), max(1, int(height / scale))),
+                          interpolation=cv2.INTER_AREA)
+
+    if models.detector is not None:
+        boxes = [(f.left(), f.top(), f.width(), f.height()) for f in models.detector(gray)]
+    else:
+        min_size = max(models.HAAR_WINDOW, int(min_px / scale))
+        max_size = max(min_size, int(max_px / scale))
+        boxes = [tuple(int(v) for v in box)
+                 for box in models.face_cascade.detectMultiScale(
+                     gray, models.cascade.face_scale, min_neighbors, minSize=(min_size, min_size), maxSize=(max_size, max_size))]
+
+    # Map back to full-resolution frame coordinates
+    boxes = [(int(x * scale) + ox, int(y * scale) + oy, int(w * scale), int(h * scale))
+             for (x, y, w, h) in boxes]
+    # dlib has no size limits of its own
+    return [box for box in boxes if min_px <= box[3] <= max_px]
+
+
+def analyze_frame(models, frame, roi=None, driver=None, eyes=None):
+    """
+    Run the detection stage on one BGR frame.
+
+    Returns a dict with 'faces', a list with one dict per face holding its
+    box and a 'driver' flag. The driver comes first and is the only face
+    measured: it also holds either the eye landmarks with their EAR (dlib +
+    predictor, plus the drowsiness model's feature vector when one is
+    loaded) or the number of eyes found by the Haar cascade. `driver` is the
+    session's previous driver box, which keeps the choice stable (see
+    face_tracking.select_driver). On the eye-cascade path the driver also
+    gets its 'eye_boxes' and 'eyes_reused'; `eyes` is the session's previous
+    (face box, eye boxes, times reused), see detect_eyes(). 'full_detection'
+    in the result tells whether the whole frame was searched. A search restricted to `roi`
+    that finds nothing falls back to a full-frame pass straight away.
+    'timings' holds the seconds spent in each stage of this call.
+
+    Only face detection works on a downscaled image; landmarks and eyes are
+    measured on the full-resolution grayscale frame.
+    """
+    timings = {}
+    started = time.perf_counter()
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    now = time.perf_counter()
+    timings['grayscale'], started = now - started, now
+
+    boxes = detect_faces(models, gray, roi) if roi is not None else []
+    full_detection = not boxes
+    if full_detection:
+        boxes = detect_faces(models, gray)
+    now = time.perf_counter()
+    timings['detect'], started = now - started, now
+
+    # However crowded the cab, at most MAX_FACES boxes and one measured face
+    boxes = sorted(boxes, key=lambda b: b[2] * b[3], reverse=True)[:MAX_FACES]
+    index = select_driver(boxes, gray.shape, driver)
+    faces = [{'box': box, 'driver': i == index} for i, box in enumerate(boxes)]
+    if faces:
+        faces.insert(0, faces.pop(index))
+
+    if models.use_advanced and faces:
+        face = faces[0]
+        x, y, w, h = face['box']
+        points = landmarks_array(models.predictor(gray, dlib.rectangle(x, y, x + w - 1, y + h - 1)))
+        now = time.perf_counter()
+        timings['landmarks'], started = now - started, now
+        face['left_eye'] = points[0, LEFT_EYE]
+        face['right_eye'] = points[0, RIGHT_EYE]
+        face['ear'] = float(compute_features(points, gray.shape)['ear'][0])
+        # The model itself runs later, batched across sessions (inference_batcher.py)
+        if models.model is not None:
+            face['features'] = feature_vectors(points, gray)[0]
+        timings['ear'] = time.perf_counter() - started
+    else:
+        if faces:
+            face = faces[0]
+            eye_boxes, reused = detect_eyes(models, gray, face['box'], eyes)
+            face['eyes_count'] = len(eye_boxes)
+            face['eye_boxes'] = eye_boxes
+            face['eyes_reused'] = reused
+        timings['eyes'] = time.perf_counter() - started
+
+    return {'faces': faces, 'full_detection': full_detection, 'timings': timings}
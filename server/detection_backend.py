@@ -0,0 +1,121 @@
+"""
+Execution backends for the detection stage of the drowsiness server.
+
+The detection stage (grayscale, face detection, landmarks, EAR) is CPU bound.
+Running it directly inside the WebSocket handler stalls every other
+connection, so the server hands it to one of these backends instead:
+
+- inline:  run on the event loop (old behaviour, handy for debugging)
+- thread:  ThreadPoolExecutor; dlib and OpenCV release the GIL while working
+- process: ProcessPoolExecutor; every worker loads its own DetectorModels.
+           Workers start from a forkserver (or spawn where that is missing),
+           never by forking the running server: by then it has an event loop
+           and threads whose locks a forked child could inherit held.
+           DETECTION_START_METHOD overrides the choice
+
+Pick one with DETECTION_BACKEND and size it with DETECTION_WORKERS.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from detection import DetectorModels, analyze_frame
+
+BACKENDS = ('inline', 'thread', 'process')
+
+# Models of this process-pool worker, set once by _init_worker
+_worker_models = None
+
+
+def _init_worker(models=None):
+    """`models` is only passed with the fork start method; otherwise load them here"""
+    global _worker_models
+    _worker_models = models if models is not None else DetectorModels()
+
+
+def _analyze_in_worker(frame, roi, driver, eyes):
+    return analyze_frame(_worker_models, frame, roi, driver, eyes)
+
+
+class DetectionBackend:
+    """Base class: tracks how many frames are waiting on the backend"""
+
+    name = 'inline'
+
+    def __init__(self, models, workers=1):
+        self.models = models
+        self.workers = workers
+        self.pending = 0
+
+    async def analyze(self, frame, roi=None, driver=None, eyes=None):
+        self.pending += 1
+        try:
+            return await self._run(frame, roi, driver, eyes)
+        finally:
+            self.pending -= 1
+
+    async def _run(self, frame, roi, driver, eyes):
+        return analyze_frame(self.models, frame, roi, driver, eyes)
+
+    def shutdown(self):
+        pass
+
+
+class InlineBackend(DetectionBackend):
+    name = 'inline'
+
+
+class ThreadBackend(DetectionBackend):
+    name = 'thread'
+
+    def __init__(self, models, workers):
+        super().__init__(models, workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='detect')
+
+    async def _run(self, frame, roi, driver, eyes):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, analyze_frame, self.models, frame, roi, driver, eyes)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessBackend(DetectionBackend):
+    name = 'process'
+
+    def __init__(self, models, workers):
+        super().__init__(models, workers)
+        methods = multiprocessing.get_all_start_methods()
+        default = 'forkserver' if 'forkserver' in methods else 'spawn'
+        self.start_method = os.getenv('DETECTION_START_METHOD', default)
+        context = multiprocessing.get_context(self.start_method)
+        if self.start_method == 'forkserver':
+            # Imported once in the fork server, so workers start without re-importing
+            context.set_forkserver_preload(['detection'])
+        # Only a fork inherits the models as they are; they do not pickle
+        initargs = (models,) if self.start_method == 'fork' else ()
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                            initargs=initargs, mp_context=context)
+
+    async def _run(self, frame, roi, driver, eyes):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, _analyze_in_worker, frame, roi, driver, eyes)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_backend(models, name=None, workers=None):
+    """Build the backend named by `name` or the DETECTION_BACKEND env var"""
+    name = (name or os.getenv('DETECTION_BACKEND', 'thread')).lower()
+    if workers is None:
+        workers = int(os.getenv('DETECTION_WORKERS', '0')) or (os.cpu_count() or 1)
+
+    if name == 'inline':
+        return InlineBackend(models)
+    if name == 'thread':
+        return ThreadBackend(models, workers)
+    if name == 'process':
+        return ProcessBackend(models, workers)
+    raise ValueError(f"Unknown detection backend '{name}', expected one of {BACKENDS}")
@@ -1,24 +1,27 @@
 from fastapi import FastAPI, WebSocket
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 import cv2
-import numpy as np
-from scipy.spatial import distance
 import asyncio
-import base64
+import time
 import json
 import os
+import numpy as np
 from datetime import datetime
-from dao import raise_sos
-
-# Try to import dlib, fallback to OpenCV if not available (for Railway deployment)
-try:
-    import dlib
-    DLIB_AVAILABLE = True
-    print("✅ dlib loaded successfully")
-except ImportError:
-    DLIB_AVAILABLE = False
-    print("⚠️  dlib not available, using OpenCV fallback")
+from detection import EYES_CLOSED_EAR, DetectorModels, simple_eye_detection
+from detection_backend import create_backend
+from frame_protocol import (RESPONSE_FRAME, RESPONSE_METADATA, negotiate,
+                            decode_binary_frame, decode_json_frame,
+                            encode_binary_result, encode_json_result)
+from face_tracking import FaceTracker
+from eye_history import EyeHistory
+from inference_batcher import InferenceBatcher
+import metrics
+from features import calculate_ear
+from flow_control import FlowController
+from frame_slot import LatestFrameSlot
+from location import parse_client_location
+from sos_outbox import SosOutbox, SosDispatcher, sos_payload
 
 app = FastAPI()
 static_dir = "static"
@@ -27,185 +30,487 @@ if not os.path.exists(static_dir):
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 class DrowsinessDetector:
-    def __init__(self):
-        # Initialize based on available libraries
-        if DLIB_AVAILABLE:
-            self.detector = dlib.get_frontal_face_detector()
-            predictor_path = "shape_predictor_68_face_landmarks.dat"
-            if os.path.exists(predictor_path):
-                self.predictor = dlib.shape_predictor(predictor_path)
-                self.use_advanced = True
-                print("✅ Using dlib with facial landmarks")
-            else:
-                self.use_advanced = False
-                print("⚠️  Landmark file not found, using basic dlib")
-        else:
-            # Fallback to OpenCV
-            self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-            self.eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
-            self.use_advanced = False
-            print("✅ Using OpenCV cascades")
-        
-        # TensorFlow model temporarily disabled due to Python 3.14 compatibility
-        # self.model = tf.keras.models.load_model("models/drowsiness_detector.keras", compile=False)
-        self.model = None  # Placeholder
+    """Per-connection drowsiness state on top of the shared DetectorModels"""
+
+    def __init__(self, models=None, backend=None, sos=None, tracker=None, batcher=None):
+        self.models = models if models is not None else get_models()
+        self.backend = backend if backend is not None else get_backend()
+        self.sos = sos if sos is not None else enqueue_sos
+        if batcher is None:
+            # The shared batcher belongs to the shared models; injected models
+            # (benchmarks, scripts) get their own, so nothing global is loaded
+            if models is None:
+                batcher = get_batcher()
+            elif self.models.model is not None:
+                batcher = InferenceBatcher(self.models.model)
+        self.batcher = batcher
+        self.detector = self.models.detector
+        self.predictor = self.models.predictor
+        self.face_cascade = self.models.face_cascade
+        self.eye_cascade = self.models.eye_cascade
+        self.use_advanced = self.models.use_advanced
+        self.model = self.models.model
+
         self.drowsy_frames = 0
         self.status = ""
         self.color = (0, 0, 0)
         self.last_alert_time = None
         self.ALERT_COOLDOWN = 30
-        self.DROWSY_FRAME_THRESHOLD = 8
+        # Drowsy after one closure this long, or this much PERCLOS over the window
+        self.CLOSED_SECONDS = float(os.getenv('DROWSY_CLOSED_SECONDS', '0.8'))
+        self.PERCLOS_THRESHOLD = float(os.getenv('PERCLOS_THRESHOLD', '0.3'))
+        # Seconds of history needed before PERCLOS is trusted
+        self.PERCLOS_MIN_SPAN = float(os.getenv('PERCLOS_MIN_SPAN_S', '10'))
+        # Eye state over time; drowsy_frames is only kept for display
+        self.history = EyeHistory()
+        # How a frame's model score joins the EAR rule: either, both, model or ear
+        self.MODEL_RULE = os.getenv('MODEL_RULE', 'either')
+        self.MODEL_THRESHOLD = float(os.getenv('MODEL_THRESHOLD', '0.5'))
         self.previous_status = ""
+        self.faces = []
+        self.timings = {}
+        # Decides when the full-frame face detector has to run
+        self.tracker = tracker if tracker is not None else FaceTracker()
+        # Latest position reported by the driver's browser, if any
+        self.location = None
 
     def calculate_ear(self, eye_points):
-        A = distance.euclidean(eye_points[1], eye_points[5])
-        B = distance.euclidean(eye_points[2], eye_points[4])
-        C = distance.euclidean(eye_points[0], eye_points[3])
-        ear = (A + B) / (2.0 * C)
-        return ear
+        return calculate_ear(eye_points)
 
     def simple_eye_detection(self, gray, face_rect):
         """Simple eye detection using OpenCV cascades"""
-        x, y, w, h = face_rect
-        roi_gray = gray[y:y+h, x:x+w]
-        eyes = self.eye_cascade.detectMultiScale(roi_gray, 1.1, 5)
-        return len(eyes)
+        return simple_eye_detection(self.models, gray, face_rect)
 
-    async def process_frame(self, frame):
+    async def process_frame(self, frame, annotate=True, timestamp=None):
+        """`timestamp` (seconds, monotonic) defaults to now; replays pass the video's clock"""
         try:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            play_alarm = False
-            current_time = datetime.now()
-            can_alert = (self.last_alert_time is None or 
-                       (current_time - self.last_alert_time).total_seconds() > self.ALERT_COOLDOWN)
-
-            if DLIB_AVAILABLE and hasattr(self, 'detector'):
-                # Use dlib detection
-                faces = self.detector(gray)
-                
-                if len(faces) == 0:
-                    self.drowsy_frames = 0
-                    self.status = "No face detected"
-                    return frame, self.status, play_alarm
-
-                for face in faces:
-                    # Draw face rectangle
-                    x, y, w, h = face.left(), face.top(), face.width(), face.height()
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
-                    
-                    if self.use_advanced and hasattr(self, 'predictor'):
-                        # Advanced landmark detection
-                        landmarks = self.predictor(gray, face)
-                        landmarks = np.array([[p.x, p.y] for p in landmarks.parts()])
-                        
-                        # Extract eye regions
-                        left_eye = landmarks[36:42]
-                        right_eye = landmarks[42:48]
-                        
-                        left_ear = self.calculate_ear(left_eye)
-                        right_ear = self.calculate_ear(right_eye)
-                        ear = (left_ear + right_ear) / 2.0
-                        
-                        # Draw eye contours
-                        left_hull = cv2.convexHull(left_eye)
-                        right_hull = cv2.convexHull(right_eye)
-                        cv2.drawContours(frame, [left_hull], -1, (0, 255, 0), 1)
-                        cv2.drawContours(frame, [right_hull], -1, (0, 255, 0), 1)
-                        
-                        # Display EAR value
-                        cv2.putText(frame, f"EAR: {ear:.2f}", (300, 30),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-                        
-                        if ear < 0.25:  # Eyes closed threshold
-                            self.drowsy_frames += 1
-                        else:
-                            self.drowsy_frames = 0
-                    else:
-                        # Basic dlib detection without landmarks - simple drowsiness check
-                        eyes_count = self.simple_eye_detection(gray, (x, y, w, h))
-                        if eyes_count < 2:
-                            self.drowsy_frames += 1
-                        else:
-                            self.drowsy_frames = max(0, self.drowsy_frames - 1)
-            else:
-                # Use OpenCV cascade detection
-                faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-                
-                if len(faces) == 0:
-                    self.drowsy_frames = 0
-                    self.status = "No face detected"
-                    return frame, self.status, play_alarm
+            # Heavy lifting happens on the configured backend, off the event loop
+            roi = self.tracker.plan(frame.shape)
+            result = await self.backend.analyze(frame, roi, self.tracker.driver, self.tracker.eyes)
+            self.tracker.update(result, roi)
+            # Seconds per stage of this frame, for benchmarks and metrics
+            self.timings = result['timings']
+            if any('features' in face for face in result['faces']):
+                started = time.perf_counter()
+                await self.score_faces(result['faces'])
+                self.timings['model'] = time.perf_counter() - started
+            return self.apply_analysis(frame, result['faces'], annotate, timestamp)
 
-                for (x, y, w, h) in faces:
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
-                    
-                    # Simple eye detection for OpenCV path
-                    eyes_count = self.simple_eye_detection(gray, (x, y, w, h))
-                    
-                    if eyes_count < 2:  # Likely eyes closed
-                        self.drowsy_frames += 1
-                    else:
-                        self.drowsy_frames = max(0, self.drowsy_frames - 1)
-
-            # Check for drowsiness
-            if self.drowsy_frames >= self.DROWSY_FRAME_THRESHOLD:
-                self.status = "DROWSY!"
-                if self.status != self.previous_status or can_alert:
-                    play_alarm = True
-                    print(f"🚨 DROWSY DETECTED! Calling raise_sos() - Frames: {self.drowsy_frames}")
-                    try:
-                        raise_sos()
-                    except Exception as e:
-                        print(f"❌ Error in raise_sos: {e}")
-                    self.last_alert_time = current_time
-                self.color = (0, 0, 255)
-            else:
-                self.status = "Active"
-                self.color = (0, 255, 0)
+        except Exception as e:
+            print(f"Error processing frame: {e}")
+            return frame, "Error processing", False
+
+    async def score_faces(self, faces):
+        """Fill in model_score from the shared batcher for faces that carry features"""
+        scored = [face for face in faces if 'features' in face]
+        if not scored or self.batcher is None:
+            return
+        scores = await self.batcher.score(np.stack([face.pop('features') for face in scored]))
+        for face, score in zip(scored, scores):
+            face['model_score'] = float(score)
 
-            # Display status
-            cv2.putText(frame, self.status, (10, 30),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, self.color, 2)
-            cv2.putText(frame, f"Drowsy Frames: {self.drowsy_frames}", (10, 60),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    def eyes_closed(self, face):
+        """EAR rule, combined with the drowsiness model's score when there is one"""
+        ear_closed = face['ear'] < EYES_CLOSED_EAR
+        if 'model_score' not in face or self.MODEL_RULE == 'ear':
+            return ear_closed
+        model_drowsy = face['model_score'] >= self.MODEL_THRESHOLD
+        if self.MODEL_RULE == 'model':
+            return model_drowsy
+        if self.MODEL_RULE == 'both':
+            return ear_closed and model_drowsy
+        return ear_closed or model_drowsy
 
-            self.previous_status = self.status
+    def is_drowsy(self):
+        """Time-window decision: a long closure now, or a high PERCLOS"""
+        if self.history.closed_for() >= self.CLOSED_SECONDS:
+            return True
+        return (self.history.span() >= self.PERCLOS_MIN_SPAN and
+                self.history.perclos() >= self.PERCLOS_THRESHOLD)
+
+    def apply_analysis(self, frame, faces, annotate=True, timestamp=None):
+        """Update this session's temporal state from one frame's detections"""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        play_alarm = False
+        current_time = datetime.now()
+        can_alert = (self.last_alert_time is None or
+                   (current_time - self.last_alert_time).total_seconds() > self.ALERT_COOLDOWN)
+        self.faces = faces
+
+        if len(faces) == 0:
+            self.drowsy_frames = 0
+            self.history.interrupt()
+            self.status = "No face detected"
             return frame, self.status, play_alarm
 
-        except Exception as e:
-            print(f"Error processing frame: {e}")
-            return frame, "Error processing", False
+        # Only the driver (always first) counts; a dozing passenger must not
+        driver = faces[0]
+        if 'ear' in driver:
+            closed = self.eyes_closed(driver)
+        else:
+            # No landmarks - simple drowsiness check on the eye cascade
+            closed = driver['eyes_count'] < 2  # Likely eyes closed
+        self.history.push(timestamp, driver.get('ear'), not closed)
+        self.drowsy_frames = self.drowsy_frames + 1 if closed else 0
+
+        # Check for drowsiness
+        if self.is_drowsy():
+            self.status = "DROWSY!"
+            if self.status != self.previous_status or can_alert:
+                play_alarm = True
+                history = self.history.stats()
+                print(f"🚨 DROWSY DETECTED! Queuing SOS - closed {history['closed_s']}s, "
+                      f"PERCLOS {history['perclos']:.0%}")
+                try:
+                    self.sos(location=self.location)
+                except Exception as e:
+                    print(f"❌ Error queuing SOS: {e}")
+                    if metrics.ENABLED:
+                        metrics.SOS_FAILURES.inc()
+                self.last_alert_time = current_time
+            self.color = (0, 0, 255)
+        else:
+            self.status = "Active"
+            self.color = (0, 255, 0)
+
+        if annotate:
+            started = time.perf_counter()
+            self.annotate(frame, faces)
+            self.timings['annotate'] = time.perf_counter() - started
+
+        self.previous_status = self.status
+        return frame, self.status, play_alarm
+
+    def annotate(self, frame, faces):
+        """Draw face boxes, eye contours, EAR and status onto the frame"""
+        # dlib boxes are drawn in green, Haar cascade boxes in blue
+        box_color = (0, 255, 0) if self.detector is not None else (255, 0, 0)
+        for face in faces:
+            # Draw face rectangle; passengers get a thin grey box
+            x, y, w, h = face['box']
+            if not face.get('driver', True):
+                cv2.rectangle(frame, (x, y), (x + w, y + h), (128, 128, 128), 1)
+                continue
+            cv2.rectangle(frame, (x, y), (x + w, y + h), box_color, 2)
+
+            if 'ear' in face:
+                # Draw eye contours
+                left_hull = cv2.convexHull(face['left_eye'])
+                right_hull = cv2.convexHull(face['right_eye'])
+                cv2.drawContours(frame, [left_hull], -1, (0, 255, 0), 1)
+                cv2.drawContours(frame, [right_hull], -1, (0, 255, 0), 1)
+
+                # Display EAR value
+                cv2.putText(frame, f"EAR: {face['ear']:.2f}", (300, 30),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+
+        # Display status
+        cv2.putText(frame, self.status, (10, 30),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, self.color, 2)
+        cv2.putText(frame, f"Closed: {self.history.closed_for():.1f}s  PERCLOS: {self.history.perclos():.0%}",
+                   (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+    def result_metadata(self, play_alarm):
+        """Structured result of the last frame, for clients that draw their own overlay"""
+        faces = []
+        for face in self.faces:
+            entry = {'box': [int(v) for v in face['box']], 'driver': face.get('driver', True)}
+            if 'id' in face:
+                entry['id'] = face['id']
+            if 'ear' in face:
+                entry['left_eye'] = face['left_eye'].tolist()
+                entry['right_eye'] = face['right_eye'].tolist()
+                entry['ear'] = round(float(face['ear']), 4)
+                if 'model_score' in face:
+                    entry['model_score'] = round(face['model_score'], 4)
+            elif 'eyes_count' in face:
+                entry['eyes_count'] = int(face['eyes_count'])
+            faces.append(entry)
+        ears = [f['ear'] for f in faces if 'ear' in f]
+        return {
+            "status": self.status,
+            "play_alarm": play_alarm,
+            "drowsy_frames": self.drowsy_frames,
+            **self.history.stats(),
+            "ear": ears[0] if ears else None,
+            "faces": faces,
+            "detect_skip_ratio": round(self.tracker.skip_ratio(), 3)
+        }
+
+_models = None
+_backend = None
+_batcher = None
+
+def get_models():
+    """Return the process-wide DetectorModels, loading them on first use"""
+    global _models
+    if _models is None:
+        _models = DetectorModels()
+    return _models
+
+def get_backend():
+    """Return the process-wide detection backend (see detection_backend.py)"""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(get_models())
+        print(f"⚙️  Detection backend: {_backend.name}")
+    return _backend
+
+def get_batcher():
+    """Return the process-wide InferenceBatcher, or None when no model is loaded"""
+    global _batcher
+    if _batcher is None and get_models().model is not None:
+        _batcher = InferenceBatcher(get_models().model)
+    return _batcher
+
+# Detector resources are built by the startup hook, after uvicorn is already
+# accepting connections, so liveness answers at once and readiness follows
+_warm_up = None
+_ready_in = None
+
+async def warm_up():
+    """Load the detector, backend and model, then run one inference through each"""
+    global _ready_in
+    started = time.perf_counter()
+    try:
+        models = await asyncio.to_thread(get_models)
+        backend = await asyncio.to_thread(get_backend)
+        get_batcher()
+        # First calls pay for lazy allocations inside OpenCV, dlib and the pool workers
+        await backend.analyze(np.zeros((480, 640, 3), dtype=np.uint8))
+        if models.model is not None:
+            models.model.predict(np.zeros((1, models.model.input_size), dtype=np.float32))
+    except Exception as e:
+        print(f"❌ Detector failed to load: {e}")
+        raise
+    _ready_in = time.perf_counter() - started
+    print(f"✅ Detector ready in {_ready_in:.2f}s")
+
+async def detector_ready():
+    """Wait until warm_up() has finished; sessions opened during startup queue here"""
+    if _warm_up is None:
+        # Used without the startup hook (tests, scripts): load on first use
+        await asyncio.to_thread(get_models)
+        return
+    await asyncio.shield(_warm_up)
+
+# SOS alerts are appended to the outbox by the frame path and delivered in the
+# background; the SQLite database is only opened by the startup hook (or the
+# first alert), never on import
+_sos_outbox = None
+_sos_dispatcher = None
+
+def get_sos_outbox():
+    """Return the process-wide SosOutbox, opening its database on first use"""
+    global _sos_outbox
+    if _sos_outbox is None:
+        _sos_outbox = SosOutbox()
+    return _sos_outbox
+
+# SOS_ENABLED=0 keeps load tests and local experiments out of the alert pipeline
+SOS_ENABLED = os.getenv('SOS_ENABLED', '1') != '0'
+
+def enqueue_sos(location=None):
+    if not SOS_ENABLED:
+        print("🔕 SOS disabled (SOS_ENABLED=0), not queuing")
+        return None
+    fields = {}
+    if location is not None:
+        fields = {'latitude': location['latitude'], 'longitude': location['longitude']}
+    key = get_sos_outbox().enqueue(sos_payload(**fields))
+    if metrics.ENABLED:
+        metrics.SOS_RAISED.inc()
+    return key
 
-detector = DrowsinessDetector()
+@app.on_event("startup")
+async def start_sos_dispatcher():
+    global _sos_dispatcher
+    _sos_dispatcher = SosDispatcher(get_sos_outbox())
+    _sos_dispatcher.start()
+
+@app.on_event("startup")
+async def start_warm_up():
+    global _warm_up
+    _warm_up = asyncio.create_task(warm_up())
+
+@app.get("/health/live")
+async def liveness():
+    """The process is up and serving; says nothing about the detector"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """200 once the detector is loaded and warmed up, 503 before (or if loading failed)"""
+    if _warm_up is None or not _warm_up.done():
+        return JSONResponse({"status": "starting"}, status_code=503)
+    if _warm_up.exception() is not None:
+        return JSONResponse({"status": "failed", "error": str(_warm_up.exception())}, status_code=503)
+    return {
+        "status": "ready",
+        "ready_in_s": round(_ready_in, 3),
+        "landmarks": _models.use_advanced,
+        "model": _models.model is not None,
+        "backend": _backend.name
+    }
+
+@app.get("/stats/inference")
+async def inference_stats():
+    """Micro-batching histograms, for tuning BATCH_WINDOW_MS and BATCH_MAX"""
+    if _batcher is None:
+        return {"model": False}
+    return dict(_batcher.stats(), model=True)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage histograms and frame/session/SOS counters in Prometheus text format"""
+    if not metrics.ENABLED:
+        return Response(status_code=404)
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.on_event("shutdown")
+async def shutdown_backend():
+    if _sos_dispatcher is not None:
+        await _sos_dispatcher.stop()
+    if _backend is not None:
+        _backend.shutdown()
+
+def skip_invalid_frame(error):
+    """A truncated or corrupt frame is logged and counted; the session goes on"""
+    print(f"⚠️ Skipping invalid frame: {error}")
+    if metrics.ENABLED:
+        metrics.FRAMES_INVALID.inc()
+
+async def receive_frames(websocket, slot, settings, detector):
+    """Receiver task: handle control messages and keep only the newest frame in `slot`"""
+    try:
+        while True:
+            # Receive frame from client (browser camera)
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+
+            # Arrival time: the wait for the detector is the 'receive' stage and
+            # part of the latency flow control reacts to
+            arrived = time.perf_counter()
+            if message.get('bytes') is not None:
+                slot.put((True, message['bytes'], slot.received, arrived))
+                continue
+
+            try:
+                data = json.loads(message['text'])  # Parse incoming frame data
+            except ValueError as e:
+                skip_invalid_frame(e)
+                continue
+            if not isinstance(data, dict):
+                skip_invalid_frame(f"expected a JSON object, got {type(data).__name__}")
+                continue
+            if data.get('type') == 'hello':
+                # Protocol negotiation; clients that skip it stay on JSON frames
+                hello = negotiate(data)
+                settings['response'] = hello['response']
+                # Only clients that negotiate understand flow-control messages
+                settings['flow'] = True
+                await websocket.send_json(hello)
+                continue
+            if data.get('type') == 'location':
+                # Driver-supplied coordinates win over the server's IP position
+                location = parse_client_location(data)
+                if location is not None:
+                    detector.location = location
+                continue
+            slot.put((False, data, slot.received, arrived))
+    except Exception as e:
+        print(f"WebSocket receive error: {e}")
+    finally:
+        slot.close()
 
 @app.websocket("/ws/video")
 async def video_feed(websocket: WebSocket):
     await websocket.accept()
+    try:
+        await detector_ready()
+    except Exception as e:
+        # Warm-up failed (see /health/ready); 1011 tells the client it is a server error
+        print(f"❌ Closing video session, detector unavailable: {e}")
+        await websocket.close(code=1011)
+        return
+    # Temporal state (drowsy counter, alert cooldown) is private to this driver
+    detector = DrowsinessDetector()
+    settings = {'response': RESPONSE_FRAME, 'flow': False}
+    flow = FlowController()
+    slot = LatestFrameSlot()
+    receiver = asyncio.create_task(receive_frames(websocket, slot, settings, detector))
+    if metrics.ENABLED:
+        metrics.ACTIVE_SESSIONS.inc()
+    reported_drops = 0
     try:
         while True:
-            # Receive frame from client (browser camera)
-            message = await websocket.receive_text()
-            data = json.loads(message)  # Parse incoming frame data
-            
-            # Decode base64 image
-            frame_data = base64.b64decode(data['frame'])
-            nparr = np.frombuffer(frame_data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if frame is not None:
-                processed_frame, status, play_alarm = await detector.process_frame(frame)
+            # Newest frame only; anything that arrived meanwhile was dropped
+            item = await slot.get()
+            if item is None:
+                break
+            is_binary, payload, received_index, arrived = item
+            started = time.perf_counter()
+            # Per-stage seconds of this frame; None keeps the frame path untimed
+            wire = {'receive': started - arrived} if metrics.ENABLED else None
+            # Only the frame we actually process gets decoded
+            try:
+                if is_binary:
+                    request = decode_binary_frame(payload, wire)
+                else:
+                    request = decode_json_frame(payload, wire)
+            except (ValueError, KeyError, TypeError) as e:
+                skip_invalid_frame(e)
+                continue
+            seq = request.seq if request.seq is not None else received_index
+
+            if settings['response'] == RESPONSE_METADATA:
+                # The client draws its own overlay: no drawing, no JPEG encode
+                _, status, play_alarm = await detector.process_frame(request.image, annotate=False)
+                buffer = None
+                meta = detector.result_metadata(play_alarm)
+            else:
+                processed_frame, status, play_alarm = await detector.process_frame(request.image)
+                encode_started = time.perf_counter()
                 _, buffer = cv2.imencode('.jpg', processed_frame)
-                base64_frame = base64.b64encode(buffer).decode('utf-8')
-                await websocket.send_json({
-                    "frame": base64_frame,
-                    "status": status,
-                    "play_alarm": play_alarm
-                })
-            await asyncio.sleep(0.03)
+                if wire is not None:
+                    wire['encode'] = time.perf_counter() - encode_started
+                meta = {"play_alarm": play_alarm}
+            meta["status"] = status
+            meta["dropped"] = slot.dropped
+            # Answer in the same framing the frame arrived in
+            send_started = time.perf_counter()
+            if is_binary:
+                await websocket.send_bytes(
+                    encode_binary_result(seq, request.client_ts, meta, buffer, play_alarm))
+            else:
+                await websocket.send_json(encode_json_result(seq, meta, buffer))
+            finished = time.perf_counter()
+
+            if wire is not None:
+                wire['send'] = finished - send_started
+                metrics.STAGE_SECONDS.observe_all(wire)
+                metrics.STAGE_SECONDS.observe_all(detector.timings)
+                metrics.FRAME_SECONDS.observe(finished - started)
+                metrics.FRAMES_PROCESSED.inc()
+                metrics.FRAMES_DROPPED.inc(slot.dropped - reported_drops)
+                reported_drops = slot.dropped
+
+            flow.record(finished - arrived)
+            hint = flow.hint()
+            if hint is not None and settings['flow']:
+                await websocket.send_json(hint)
+                flow.mark_sent()
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
-        pass
+        receiver.cancel()
+        if metrics.ENABLED:
+            metrics.ACTIVE_SESSIONS.dec()
+            metrics.FRAMES_DROPPED.inc(slot.dropped - reported_drops)
+        print(f"📉 Video session closed: {slot.received} frames received, {slot.dropped} dropped, "
+              f"tracking {detector.tracker.stats()}")
 
 @app.get("/")
 async def get_html():
@@ -269,7 +574,10 @@ async def get_html():
         <div class="container">
             <h1>Drowsiness Detection System</h1>
             <button id="startButton">Start Detection</button>
-            <video id="webcam" autoplay muted style="display: none; width: 100%; max-width: 640px;"></video>
+            <div id="stage" style="position: relative; width: 100%; max-width: 640px; margin: 0 auto;">
+                <video id="webcam" autoplay muted style="display: none; width: 100%;"></video>
+                <canvas id="overlay" style="position: absolute; left: 0; top: 0; width: 100%; height: 100%;"></canvas>
+            </div>
             <canvas id="canvas" style="display: none;"></canvas>
             <img id="video" alt="Video feed" style="display: none;">
             <div id="status">Click 'Start Detection' to begin</div>
@@ -278,6 +586,8 @@ async def get_html():
             let ws = null;
             const video = document.getElementById('video');
             const webcam = document.getElementById('webcam');
+            const overlay = document.getElementById('overlay');
+            const overlayCtx = overlay.getContext('2d');
             const canvas = document.getElementById('canvas');
             const ctx = canvas.getContext('2d');
             const status = document.getElementById('status');
@@ -287,6 +597,15 @@ async def get_html():
             let alarmBuffer = null;
             let currentAlarm = null;
             let stream = null;
+            let binaryMode = false;
+            let frameSeq = 0;
+            let frameUrl = null;
+            let metadataMode = false;
+            // Capture settings, adjusted by the server's flow-control hints
+            let captureInterval = 100;
+            let maxWidth = 640;
+            let jpegQuality = 0.8;
+            let locationWatch = null;
 
             function createBeepSound(frequency = 800, duration = 500) {
                 if (!audioContext) return null;
@@ -336,13 +655,9 @@ async def get_html():
                     stream = await navigator.mediaDevices.getUserMedia({ video: true });
                     webcam.srcObject = stream;
                     webcam.style.display = 'block';
-                    video.style.display = 'block';
                     
                     // Set canvas size
-                    webcam.onloadedmetadata = function() {
-                        canvas.width = webcam.videoWidth;
-                        canvas.height = webcam.videoHeight;
-                    };
+                    webcam.onloadedmetadata = resizeCapture;
                     
                     if (!audioContext) {
                         audioContext = new (window.AudioContext || window.webkitAudioContext)();
@@ -355,14 +670,52 @@ async def get_html():
                     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
                     ws = new WebSocket(`${protocol}//${window.location.host}/ws/video`);
                     
+                    ws.binaryType = 'arraybuffer';
+
                     ws.onopen = function() {
-                        // Start sending frames
+                        // Ask for binary frames and metadata-only results, then start sending frames
+                        ws.send(JSON.stringify({ type: 'hello', protocol: 'binary', response: 'metadata' }));
+                        watchLocation();
                         sendFrames();
                     };
-                    
+
                     ws.onmessage = function(event) {
-                        const data = JSON.parse(event.data);
-                        video.src = `data:image/jpeg;base64,${data.frame}`;
+                        let data;
+                        if (event.data instanceof ArrayBuffer) {
+                            // RESPONSE_HEADER: seq u32, client_ts f64, flags u8, meta_len u32
+                            const view = new DataView(event.data);
+                            const metaLen = view.getUint32(13);
+                            data = JSON.parse(new TextDecoder().decode(new Uint8Array(event.data, 17, metaLen)));
+                            // The echoed client timestamp gives the real end-to-end latency
+                            data.latency_ms = performance.now() - view.getFloat64(4);
+                            if (event.data.byteLength > 17 + metaLen) {
+                                const jpeg = new Blob([new Uint8Array(event.data, 17 + metaLen)], { type: 'image/jpeg' });
+                                if (frameUrl) URL.revokeObjectURL(frameUrl);
+                                frameUrl = URL.createObjectURL(jpeg);
+                                video.src = frameUrl;
+                            }
+                        } else {
+                            data = JSON.parse(event.data);
+                            if (data.type === 'hello') {
+                                binaryMode = data.protocol === 'binary';
+                                metadataMode = data.response === 'metadata';
+                                video.style.display = metadataMode ? 'none' : 'block';
+                                return;
+                            }
+                            if (data.type === 'flow') {
+                                captureInterval = data.interval_ms;
+                                maxWidth = data.max_width;
+                                jpegQuality = data.jpeg_quality;
+                                resizeCapture();
+                                return;
+                            }
+                            if (data.frame) {
+                                video.src = `data:image/jpeg;base64,${data.frame}`;
+                            }
+                        }
+                        if (metadataMode) {
+                            drawOverlay(data);
+                        }
                         status.textContent = data.status;
                         status.className = '';
                         if (data.status.includes('Active')) {
@@ -381,6 +734,10 @@ async def get_html():
                         isDetectionRunning = false;
                         startButton.textContent = 'Start Detection';
                         stopAlarm();
+                        if (locationWatch !== null) {
+                            navigator.geolocation.clearWatch(locationWatch);
+                            locationWatch = null;
+                        }
                         if (stream) {
                             stream.getTracks().forEach(track => track.stop());
                         }
@@ -396,20 +753,88 @@ async def get_html():
                 }
             }
             
+            function drawOverlay(data) {
+                overlayCtx.clearRect(0, 0, overlay.width, overlay.height);
+                const drowsy = data.status.includes('DROWSY');
+                (data.faces || []).forEach(face => {
+                    const [x, y, w, h] = face.box;
+                    if (face.driver === false) {
+                        // Passengers are tracked but never measured
+                        overlayCtx.lineWidth = 1;
+                        overlayCtx.strokeStyle = '#888888';
+                        overlayCtx.strokeRect(x, y, w, h);
+                        return;
+                    }
+                    overlayCtx.lineWidth = 2;
+                    overlayCtx.strokeStyle = drowsy ? '#ff0000' : '#00ff00';
+                    overlayCtx.strokeRect(x, y, w, h);
+                    [face.left_eye, face.right_eye].forEach(eye => {
+                        if (!eye) return;
+                        overlayCtx.lineWidth = 1;
+                        overlayCtx.beginPath();
+                        eye.forEach(([px, py], i) => i ? overlayCtx.lineTo(px, py) : overlayCtx.moveTo(px, py));
+                        overlayCtx.closePath();
+                        overlayCtx.stroke();
+                    });
+                });
+                overlayCtx.font = '18px Arial';
+                overlayCtx.fillStyle = drowsy ? '#ff0000' : '#00ff00';
+                overlayCtx.fillText(data.status, 10, 25);
+                overlayCtx.fillStyle = '#ffffff';
+                overlayCtx.fillText(`Closed: ${(data.closed_s || 0).toFixed(1)}s  PERCLOS: ${Math.round((data.perclos || 0) * 100)}%`, 10, 50);
+                if (data.ear !== null && data.ear !== undefined) {
+                    overlayCtx.fillText(`EAR: ${data.ear.toFixed(2)}`, overlay.width - 110, 25);
+                }
+                if (data.latency_ms !== undefined) {
+                    overlayCtx.fillText(`Latency: ${Math.round(data.latency_ms)} ms`, overlay.width - 150, 50);
+                }
+            }
+
+            function watchLocation() {
+                // SOS records use the driver's own position when the browser shares it
+                if (!navigator.geolocation || locationWatch !== null) return;
+                locationWatch = navigator.geolocation.watchPosition(position => {
+                    if (!ws || ws.readyState !== WebSocket.OPEN) return;
+                    ws.send(JSON.stringify({
+                        type: 'location',
+                        latitude: position.coords.latitude,
+                        longitude: position.coords.longitude,
+                        accuracy: position.coords.accuracy
+                    }));
+                }, err => console.log('Location unavailable:', err.message), { maximumAge: 60000 });
+            }
+
+            function resizeCapture() {
+                if (!webcam.videoWidth) return;
+                // Landmarks come back in capture coordinates, so the overlay matches the capture canvas
+                const scale = Math.min(1, maxWidth / webcam.videoWidth);
+                canvas.width = overlay.width = Math.round(webcam.videoWidth * scale);
+                canvas.height = overlay.height = Math.round(webcam.videoHeight * scale);
+            }
+
             function sendFrames() {
                 if (!isDetectionRunning || !ws || ws.readyState !== WebSocket.OPEN) return;
                 
                 ctx.drawImage(webcam, 0, 0, canvas.width, canvas.height);
                 canvas.toBlob(function(blob) {
+                    if (binaryMode) {
+                        // REQUEST_HEADER: seq u32, client_ts f64, flags u8, then the raw JPEG
+                        const header = new DataView(new ArrayBuffer(13));
+                        header.setUint32(0, frameSeq++);
+                        header.setFloat64(4, performance.now());
+                        header.setUint8(12, 0);
+                        ws.send(new Blob([header.buffer, blob]));
+                        return;
+                    }
                     const reader = new FileReader();
                     reader.onload = function() {
                         const base64 = reader.result.split(',')[1];
                         ws.send(JSON.stringify({ frame: base64 }));
                     };
                     reader.readAsDataURL(blob);
-                }, 'image/jpeg', 0.8);
+                }, 'image/jpeg', jpegQuality);
                 
-                setTimeout(sendFrames, 100); // Send frame every 100ms
+                setTimeout(sendFrames, captureInterval); // Pace set by the server's flow hints
             }
 
             startButton.addEventListener('click', startDetection);
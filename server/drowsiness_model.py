@@ -0,0 +1,85 @@
+"""
+NumPy-only inference for the drowsiness MLP trained by training.py.
+
+TensorFlow does not load on the production Python, so the server never used
+the trained model. export_model.py turns the pickled Keras model and its
+StandardScaler into a plain .npz: the scaler is folded into the first Dense
+layer and every BatchNormalization into the Dense layer after it, which
+leaves a chain of matrix multiplies and activations. NumpyMLP runs that chain
+on a whole batch of feature vectors with nothing but NumPy.
+"""
+import os
+
+import numpy as np
+
+DEFAULT_MODEL_PATH = "models/drowsiness_mlp.npz"
+# Everything predict() knows how to run; anything else is rejected, not skipped
+ACTIVATIONS = ('linear', 'relu', 'leaky_relu', 'sigmoid')
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class NumpyMLP:
+    """Folded Dense layers with LeakyReLU between them and a sigmoid output"""
+
+    def __init__(self, weights, biases, activations, alpha=0.1):
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+        unsupported = sorted(set(self.activations) - set(ACTIVATIONS))
+        if unsupported:
+            raise ValueError(f"Unsupported activations {unsupported}, expected one of {ACTIVATIONS}")
+        self.alpha = float(alpha)
+
+    @property
+    def input_size(self):
+        return self.weights[0].shape[0]
+
+    def predict(self, features):
+        """Drowsiness probability for every row of an (N, input_size) batch, shape (N,)"""
+        x = np.asarray(features, dtype=np.float32)
+        if x.ndim == 1:
+            x = x[None, :]
+        for w, b, activation in zip(self.weights, self.biases, self.activations):
+            x = x @ w
+            x += b
+            if activation == 'leaky_relu':
+                # max(x, alpha * x) is LeakyReLU for 0 < alpha < 1
+                x = np.maximum(x, x * self.alpha)
+            elif activation == 'relu':
+                np.maximum(x, 0, out=x)
+            elif activation == 'sigmoid':
+                x = _sigmoid(x)
+        return x[:, 0]
+
+    def save(self, path):
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f'W{i}'] = w
+            arrays[f'b{i}'] = b
+        np.savez(path, activations=np.array(self.activations), alpha=np.float64(self.alpha), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            count = len(data['activations'])
+            return cls([data[f'W{i}'] for i in range(count)],
+                       [data[f'b{i}'] for i in range(count)],
+                       [str(a) for a in data['activations']],
+                       float(data['alpha']))
+
+
+def load_model(path=None):
+    """The exported model at `path` or DROWSINESS_MODEL, or None if there is none"""
+    path = path or os.getenv('DROWSINESS_MODEL', DEFAULT_MODEL_PATH)
+    if not os.path.exists(path):
+        return None
+    try:
+        model = NumpyMLP.load(path)
+    except Exception as e:
+        print(f"⚠️  Could not load drowsiness model {path}: {e}")
+        return None
+    print(f"✅ Drowsiness model loaded ({len(model.weights)} layers, {model.input_size} features)")
+    return model
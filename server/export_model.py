@@ -0,0 +1,153 @@
+"""
+Export the trained Keras drowsiness model to a NumPy-only .npz.
+
+training.py pickles {'model', 'history', 'feature_shape', 'scaler'} into
+models/drowsiness_detector.keras. This script (which does need TensorFlow and
+scikit-learn, unlike the server) reads that file and folds:
+
+- the StandardScaler into the first Dense layer,
+- every BatchNormalization into the Dense layer that follows it (or into the
+  one before it when no activation sits in between),
+
+drops Dropout, and saves the remaining Dense/activation chain for
+drowsiness_model.NumpyMLP. The exported model is checked against Keras on
+random inputs before it is written.
+
+Usage:
+    python export_model.py
+    python export_model.py --input models/drowsiness_detector.keras --output models/drowsiness_mlp.npz
+"""
+import argparse
+import pickle
+
+import numpy as np
+
+from drowsiness_model import ACTIVATIONS, DEFAULT_MODEL_PATH, NumpyMLP
+
+
+def keras_layer_specs(model):
+    """Describe a Sequential model as plain dicts of NumPy arrays"""
+    specs = []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        config = layer.get_config()
+        if kind == 'Dense':
+            weights = layer.get_weights()
+            bias = weights[1] if len(weights) > 1 else np.zeros(weights[0].shape[1])
+            specs.append({'type': 'dense', 'W': weights[0], 'b': bias,
+                          'activation': config.get('activation', 'linear')})
+        elif kind == 'LeakyReLU':
+            # Keras 2 calls it alpha, Keras 3 negative_slope
+            specs.append({'type': 'leaky_relu',
+                          'alpha': config.get('negative_slope', config.get('alpha', 0.3))})
+        elif kind == 'ReLU':
+            specs.append({'type': 'relu'})
+        elif kind == 'BatchNormalization':
+            weights = list(layer.get_weights())
+            gamma = weights.pop(0) if config.get('scale', True) else None
+            beta = weights.pop(0) if config.get('center', True) else None
+            mean, variance = weights
+            specs.append({'type': 'batchnorm',
+                          'gamma': np.ones_like(mean) if gamma is None else gamma,
+                          'beta': np.zeros_like(mean) if beta is None else beta,
+                          'mean': mean, 'variance': variance, 'epsilon': config.get('epsilon', 1e-3)})
+        elif kind in ('Dropout', 'InputLayer'):
+            continue
+        else:
+            raise ValueError(f"Cannot export layer {layer.name} of type {kind}")
+    return specs
+
+
+def fold_layers(specs, scaler_mean=None, scaler_scale=None):
+    """
+    Fold the scaler and BatchNormalization into the Dense layers.
+
+    Returns (weights, biases, activations, alpha) for NumpyMLP. An affine
+    x * a + c in front of a Dense layer becomes W' = a[:, None] * W and
+    b' = c @ W + b.
+    """
+    weights, biases, activations = [], [], []
+    alphas = set()
+    # Pending per-feature affine (a, c) to apply to the next Dense layer's input
+    pending = None
+    if scaler_mean is not None:
+        pending = (1.0 / scaler_scale, -scaler_mean / scaler_scale)
+
+    for spec in specs:
+        if spec['type'] == 'dense':
+            if spec['activation'] not in ACTIVATIONS:
+                raise ValueError(f"Cannot export activation '{spec['activation']}', "
+                                 f"NumpyMLP supports {ACTIVATIONS}")
+            w = spec['W'].astype(np.float64)
+            b = spec['b'].astype(np.float64)
+            if pending is not None:
+                a, c = pending
+                b = c @ w + b
+                w = a[:, None] * w
+                pending = None
+            weights.append(w)
+            biases.append(b)
+            activations.append(spec['activation'])
+        elif spec['type'] in ('leaky_relu', 'relu'):
+            if activations[-1] != 'linear':
+                raise ValueError("Two activations in a row cannot be folded")
+            activations[-1] = spec['type']
+            if spec['type'] == 'leaky_relu':
+                alphas.add(float(spec['alpha']))
+        elif spec['type'] == 'batchnorm':
+            a = spec['gamma'] / np.sqrt(spec['variance'] + spec['epsilon'])
+            c = spec['beta'] - spec['mean'] * a
+            if activations and activations[-1] == 'linear':
+                # Straight after a Dense layer: fold into that layer's output
+                weights[-1] = weights[-1] * a[None, :]
+                biases[-1] = biases[-1] * a + c
+            else:
+                pending = (a, c)
+
+    if pending is not None:
+        raise ValueError("BatchNormalization after the last Dense layer cannot be folded")
+    if len(alphas) > 1:
+        raise ValueError(f"LeakyReLU slopes differ between layers: {sorted(alphas)}")
+    return weights, biases, activations, alphas.pop() if alphas else 0.0
+
+
+def export(input_path, output_path, samples=256):
+    with open(input_path, 'rb') as f:
+        model_data = pickle.load(f)
+    model = model_data['model']
+    scaler = model_data.get('scaler')
+
+    specs = keras_layer_specs(model)
+    if scaler is not None:
+        weights, biases, activations, alpha = fold_layers(specs, scaler.mean_, scaler.scale_)
+    else:
+        weights, biases, activations, alpha = fold_layers(specs)
+    mlp = NumpyMLP(weights, biases, activations, alpha)
+
+    # Random inputs around the training distribution
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(samples, mlp.input_size))
+    if scaler is not None:
+        features = features * scaler.scale_ + scaler.mean_
+        expected = model.predict(scaler.transform(features), verbose=0)[:, 0]
+    else:
+        expected = model.predict(features, verbose=0)[:, 0]
+    error = float(np.max(np.abs(mlp.predict(features) - expected)))
+    print(f"🔍 Max difference to Keras on {samples} samples: {error:.2e}")
+    if error > 1e-3:
+        raise SystemExit("❌ Exported model disagrees with Keras, not saving")
+
+    mlp.save(output_path)
+    print(f"✅ Exported {len(weights)} Dense layers ({mlp.input_size} features) to {output_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Keras drowsiness model for NumPy inference")
+    parser.add_argument('--input', default='models/drowsiness_detector.keras')
+    parser.add_argument('--output', default=DEFAULT_MODEL_PATH)
+    args = parser.parse_args()
+    export(args.input, args.output)
+
+
+if __name__ == "__main__":
+    main()
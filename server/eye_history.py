@@ -0,0 +1,149 @@
+"""
+Per-session eye-state history over a sliding time window.
+
+The drowsiness decision used to be a count of consecutive closed-eye frames,
+so it meant something different at 5 fps than at 30 fps, and whenever the
+server fell behind. EyeHistory keeps the last HISTORY_SIZE samples of
+(monotonic timestamp, EAR, eyes open) in fixed NumPy arrays used as a ring
+buffer and maintains, incrementally and in O(1) amortized per frame:
+
+- PERCLOS: the fraction of the last PERCLOS_WINDOW_S seconds with eyes closed,
+  weighted by time rather than by frame count;
+- blink rate: closures shorter than BLINK_MAX_S, per minute;
+- the current closure and the longest closure in the window.
+
+Each sample accounts for the time since the previous one, capped at
+MAX_GAP_S so a stalled connection does not count as a long closure; closure
+lengths add up the same capped durations. Memory
+per session is constant: the arrays never grow, and blinks and closures live
+in bounded deques.
+"""
+import os
+from collections import deque
+
+import numpy as np
+
+HISTORY_SIZE = int(os.getenv('HISTORY_SIZE', '1024'))
+PERCLOS_WINDOW_S = float(os.getenv('PERCLOS_WINDOW_S', '30'))
+BLINK_MAX_S = 0.4
+MAX_GAP_S = 0.5
+
+
+class EyeHistory:
+    """Fixed-size ring of eye-state samples with sliding-window statistics"""
+
+    def __init__(self, window_s=None, capacity=None):
+        self.window = window_s or PERCLOS_WINDOW_S
+        self.capacity = capacity or HISTORY_SIZE
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.ears = np.full(self.capacity, np.nan, dtype=np.float32)
+        self.open = np.zeros(self.capacity, dtype=bool)
+        # Seconds each sample accounts for (time since the previous sample)
+        self.durations = np.zeros(self.capacity, dtype=np.float64)
+        self.start = 0
+        self.size = 0
+
+        self.total_s = 0.0
+        self.closed_s = 0.0
+        self.last_ts = None
+        # Seconds of the closure in progress, from the same capped durations
+        # as PERCLOS; None while the eyes are open
+        self.closure_s = None
+        # End times of blinks, and (end time, length) of closures with
+        # decreasing lengths, so the longest closure is always at the front
+        self.blinks = deque(maxlen=self.capacity)
+        self.closures = deque(maxlen=self.capacity)
+
+    def push(self, timestamp, ear, eyes_open):
+        """Add one frame's eye state; `timestamp` is in seconds on a monotonic clock"""
+        duration = 0.0
+        if self.last_ts is not None:
+            duration = min(max(0.0, timestamp - self.last_ts), MAX_GAP_S)
+        if self.size == self.capacity:
+            self._evict()
+        index = (self.start + self.size) % self.capacity
+        self.timestamps[index] = timestamp
+        self.ears[index] = np.nan if ear is None else ear
+        self.open[index] = eyes_open
+        self.durations[index] = duration
+        self.size += 1
+        self.total_s += duration
+        if not eyes_open:
+            self.closed_s += duration
+
+        if self.closure_s is not None:
+            self.closure_s += duration
+        if not eyes_open and self.closure_s is None:
+            self.closure_s = 0.0
+        elif eyes_open and self.closure_s is not None:
+            self._end_closure(timestamp)
+        self.last_ts = timestamp
+
+        cutoff = timestamp - self.window
+        while self.size and self.timestamps[self.start] < cutoff:
+            self._evict()
+        # A full buffer can cover less than the window; stay consistent with it
+        cutoff = self.timestamps[self.start]
+        while self.blinks and self.blinks[0] < cutoff:
+            self.blinks.popleft()
+        while self.closures and self.closures[0][0] < cutoff:
+            self.closures.popleft()
+
+    def interrupt(self):
+        """No face this frame: end any closure, and do not bridge the gap"""
+        self.closure_s = None
+        self.last_ts = None
+
+    def _end_closure(self, timestamp):
+        length, self.closure_s = self.closure_s, None
+        if length <= BLINK_MAX_S:
+            self.blinks.append(timestamp)
+        while self.closures and self.closures[-1][1] <= length:
+            self.closures.pop()
+        self.closures.append((timestamp, length))
+
+    def _evict(self):
+        duration = float(self.durations[self.start])
+        self.total_s -= duration
+        if not self.open[self.start]:
+            self.closed_s -= duration
+        self.start = (self.start + 1) % self.capacity
+        self.size -= 1
+        if not self.size:
+            # Nothing left to subtract from; drop accumulated rounding error
+            self.total_s = self.closed_s = 0.0
+
+    def span(self):
+        """Seconds of history currently covered"""
+        return self.total_s
+
+    def perclos(self):
+        """Fraction of the covered window spent with eyes closed"""
+        if self.total_s <= 0.0:
+            return 0.0
+        return min(1.0, max(0.0, self.closed_s / self.total_s))
+
+    def closed_for(self):
+        """Length of the closure in progress, in seconds (0 with eyes open)"""
+        return self.closure_s or 0.0
+
+    def longest_closure(self):
+        """Longest closure ending in the window, or the current one if longer"""
+        longest = self.closures[0][1] if self.closures else 0.0
+        return max(longest, self.closed_for())
+
+    def blink_rate(self):
+        """Blinks per minute over the covered window"""
+        span = self.span()
+        if span < 1.0:
+            return 0.0
+        return len(self.blinks) * 60.0 / span
+
+    def stats(self):
+        return {
+            'perclos': round(self.perclos(), 3),
+            'blink_rate': round(self.blink_rate(), 1),
+            'closed_s': round(self.closed_for(), 2),
+            'longest_closure_s': round(self.longest_closure(), 2),
+            'window_s': round(self.span(), 1)
+        }
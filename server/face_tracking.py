@@ -0,0 +1,179 @@
+"""
+Face tracking between full-frame detections.
+
+A driver's face barely moves from one frame to the next, yet the detector
+used to search the whole frame every time. FaceTracker runs the full
+detection only every `detect_every` frames; in between it asks for a search
+restricted to the last face box plus a margin, which costs a fraction of a
+full pass. Tracking is dropped, and the next frame gets a full detection,
+when the restricted search finds nothing or the face jumped further than a
+track can explain.
+
+Set DETECT_EVERY=1 to detect on every frame (old behaviour).
+
+Only one face per session is the driver. select_driver() picks it by
+DRIVER_SELECTION ('largest', the default, or 'central') and keeps the same
+face in the role across frames, so a passenger only takes over when the
+driver's face is gone or is clearly outscored. The tracker follows the
+driver and gives every face a small integer id that stays with it from frame
+to frame (plain IoU matching, no appearance model).
+"""
+import math
+import os
+
+DRIVER_SELECTIONS = ('largest', 'central')
+DRIVER_SELECTION = os.getenv('DRIVER_SELECTION', 'largest')
+# Another face has to score this much better than the current driver to take over
+SWITCH_RATIO = 1.5
+
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+
+def driver_score(box, frame_shape, selection=None):
+    """How likely `box` is the driver's face; higher is better"""
+    x, y, w, h = box
+    height, width = frame_shape[:2]
+    if (selection or DRIVER_SELECTION) == 'central':
+        dx = (x + w / 2.0) / width - 0.5
+        dy = (y + h / 2.0) / height - 0.5
+        # 1 in the middle of the frame, 0 in a corner
+        return 1.0 - math.hypot(dx, dy) / math.hypot(0.5, 0.5)
+    return (w * h) / float(width * height)
+
+
+def select_driver(boxes, frame_shape, previous=None, selection=None):
+    """
+    Index of the driver's box in `boxes`, or None when there are no faces.
+
+    The face overlapping the `previous` driver box keeps the role unless
+    another one scores SWITCH_RATIO times higher.
+    """
+    if not boxes:
+        return None
+    scores = [driver_score(box, frame_shape, selection) for box in boxes]
+    best = max(range(len(boxes)), key=scores.__getitem__)
+    if previous is None:
+        return best
+    overlaps = [box_iou(box, previous) for box in boxes]
+    incumbent = max(range(len(boxes)), key=overlaps.__getitem__)
+    if overlaps[incumbent] >= FaceTracker.MIN_IOU and scores[best] < scores[incumbent] * SWITCH_RATIO:
+        return incumbent
+    return best
+
+
+class FaceTracker:
+    """Per-session choice between a full-frame detection and an ROI re-detect"""
+
+    # Below this overlap with the previous box the track is not trusted
+    MIN_IOU = 0.3
+    # Full detections a face may be missing from before its id is forgotten
+    TRACK_TTL = 3
+
+    def __init__(self, detect_every=None, margin=0.5):
+        if detect_every is None:
+            detect_every = int(os.getenv('DETECT_EVERY', '5'))
+        self.detect_every = max(1, detect_every)
+        # ROI = last box grown by this fraction of its size on every side
+        self.margin = margin
+        self.box = None
+        # Last driver box, kept while the ROI track is reset or the face is briefly gone
+        self.driver = None
+        # (face box, eye boxes, times reused in a row) of the driver, from the eye cascade
+        self.eyes = None
+        # id -> [box, full detections missed]
+        self.tracks = {}
+        self.next_id = 1
+        self.since_detection = 0
+        self.frames = 0
+        self.full_detections = 0
+        self.lost = 0
+
+    def plan(self, frame_shape):
+        """ROI (x, y, w, h) to search in the next frame, or None for a full detection"""
+        if self.box is None or self.since_detection + 1 >= self.detect_every:
+            return None
+        height, width = frame_shape[:2]
+        x, y, w, h = self.box
+        dx, dy = int(w * self.margin), int(h * self.margin)
+        x0, y0 = max(0, x - dx), max(0, y - dy)
+        x1, y1 = min(width, x + w + dx), min(height, y + h + dy)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def update(self, result, roi=None):
+        """Record the outcome of analyze_frame() for the frame planned with `roi`"""
+        self.frames += 1
+        faces = result['faces']
+        if result['full_detection']:
+            self.full_detections += 1
+            self.since_detection = 0
+            if roi is not None:
+                self.lost += 1
+        else:
+            self.since_detection += 1
+
+        self.assign_ids(faces, result['full_detection'])
+        if not faces:
+            self.box = None
+            self.eyes = None
+            return
+        drivers = [face for face in faces if face.get('driver')]
+        box = drivers[0]['box'] if drivers else max((face['box'] for face in faces), key=lambda b: b[2] * b[3])
+        self.driver = box
+        if drivers and 'eye_boxes' in drivers[0]:
+            reused = self.eyes[2] + 1 if drivers[0]['eyes_reused'] and self.eyes else 0
+            self.eyes = (box, drivers[0]['eye_boxes'], reused)
+        if not result['full_detection'] and self.box is not None and box_iou(box, self.box) < self.MIN_IOU:
+            # The face jumped: confirm with a full detection next frame
+            self.box = None
+            self.lost += 1
+            return
+        self.box = box
+
+    def assign_ids(self, faces, full_detection):
+        """Give each face the id of the track it overlaps most, or a new one"""
+        free = dict(self.tracks)
+        for face in faces:
+            match, best = None, self.MIN_IOU
+            for track_id, (box, _) in free.items():
+                overlap = box_iou(face['box'], box)
+                if overlap >= best:
+                    match, best = track_id, overlap
+            if match is None:
+                match = self.next_id
+                self.next_id += 1
+            else:
+                del free[match]
+            self.tracks[match] = [face['box'], 0]
+            face['id'] = match
+        # ROI searches only look around the driver, so only a full pass can miss a face
+        if full_detection:
+            for track_id in free:
+                self.tracks[track_id][1] += 1
+                if self.tracks[track_id][1] > self.TRACK_TTL:
+                    del self.tracks[track_id]
+
+    def skip_ratio(self):
+        """Fraction of frames that did not need a full-frame detection"""
+        if not self.frames:
+            return 0.0
+        return 1.0 - self.full_detections / self.frames
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'full_detections': self.full_detections,
+            'lost': self.lost,
+            'skip_ratio': round(self.skip_ratio(), 3)
+        }
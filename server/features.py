@@ -0,0 +1,114 @@
+"""
+Facial features computed from dlib's 68-point landmarks.
+
+The live server, training.py and testing.py all import from here, so the EAR
+the server acts on is the same EAR the model was trained with. Everything
+works on a whole batch of faces at once: landmarks_array() copies dlib
+shapes into one (N, 68, 2) array and the ratios are computed for all faces
+in a single NumPy pass.
+"""
+import cv2
+import numpy as np
+
+NUM_LANDMARKS = 68
+LEFT_EYE = slice(36, 42)
+RIGHT_EYE = slice(42, 48)
+MOUTH = slice(48, 68)
+NOSE_BRIDGE_TOP = 27
+NOSE_TIP_END = 35
+HIST_BINS = 8
+
+# Bump whenever feature_vectors() changes, so cached training features are rebuilt
+FEATURE_VERSION = 1
+
+# Scalar features in front of the landmark vector, in training order
+SCALAR_FEATURES = ('left_ear', 'right_ear', 'mar', 'ear_var', 'nose_angle')
+FEATURE_LENGTH = len(SCALAR_FEATURES) + NUM_LANDMARKS * 2 + HIST_BINS
+
+
+def landmarks_array(shapes):
+    """
+    Copy one dlib full_object_detection, or a list of them, into an (N, 68, 2) int32 array.
+
+    The array is allocated once for the whole batch and filled straight from
+    the dlib points, without building per-point Python lists.
+    """
+    if hasattr(shapes, 'parts'):
+        shapes = [shapes]
+    count = len(shapes) * NUM_LANDMARKS * 2
+    flat = np.fromiter((v for shape in shapes for p in shape.parts() for v in (p.x, p.y)),
+                       dtype=np.int32, count=count)
+    return flat.reshape(len(shapes), NUM_LANDMARKS, 2)
+
+
+def _aspect_ratios(points, vertical, horizontal):
+    """(|p[a]-p[b]| + |p[c]-p[d]|) / (2 |p[e]-p[f]|) over the last-but-one axis"""
+    points = points.astype(np.float64, copy=False)
+    (a, b), (c, d) = vertical
+    e, f = horizontal
+    v1 = np.linalg.norm(points[..., a, :] - points[..., b, :], axis=-1)
+    v2 = np.linalg.norm(points[..., c, :] - points[..., d, :], axis=-1)
+    h = np.linalg.norm(points[..., e, :] - points[..., f, :], axis=-1)
+    return (v1 + v2) / (2.0 * h)
+
+
+def calculate_ear(eye_points):
+    """Eye aspect ratio of six eye landmarks, or of a (..., 6, 2) stack of eyes"""
+    return _aspect_ratios(np.asarray(eye_points), ((1, 5), (2, 4)), (0, 3))
+
+
+def calculate_mar(mouth_points):
+    """Mouth aspect ratio of the 20 mouth landmarks, or of a (..., 20, 2) stack"""
+    return _aspect_ratios(np.asarray(mouth_points), ((2, 10), (4, 8)), (0, 6))
+
+
+def compute_features(points, frame_shape):
+    """
+    Every geometric feature of an (N, 68, 2) landmark batch.
+
+    Returns a dict of arrays with one entry per face: left_ear, right_ear,
+    ear (their mean), mar, ear_var, nose_angle and 'normalized', the
+    landmarks divided by the frame size and flattened to (N, 136).
+    """
+    points = np.asarray(points)
+    height, width = frame_shape[:2]
+    # Both eyes in one go: (N, 2, 6, 2)
+    eyes = np.stack((points[:, LEFT_EYE], points[:, RIGHT_EYE]), axis=1)
+    ears = calculate_ear(eyes)
+    left_ear, right_ear = ears[:, 0], ears[:, 1]
+    delta = points[:, NOSE_TIP_END] - points[:, NOSE_BRIDGE_TOP]
+    normalized = points / np.array([width, height], dtype=np.float64)
+    return {
+        'left_ear': left_ear,
+        'right_ear': right_ear,
+        'ear': (left_ear + right_ear) / 2.0,
+        'mar': calculate_mar(points[:, MOUTH]),
+        # np.var of two values
+        'ear_var': ((left_ear - right_ear) / 2.0) ** 2,
+        'nose_angle': np.arctan2(delta[:, 1], delta[:, 0]),
+        'normalized': normalized.reshape(len(points), -1)
+    }
+
+
+def eye_histogram(gray, eye_points):
+    """8-bin intensity histogram of the box around one eye (zeros if the box is empty)"""
+    x0, y0 = eye_points.min(axis=0)
+    x1, y1 = eye_points.max(axis=0)
+    region = gray[y0:y1, x0:x1]
+    if region.size == 0:
+        return np.zeros(HIST_BINS, dtype=np.float32)
+    return cv2.calcHist([region], [0], None, [HIST_BINS], [0, 256]).flatten()
+
+
+def feature_vectors(points, gray):
+    """(N, FEATURE_LENGTH) model input for a landmark batch found in grayscale image `gray`"""
+    points = np.asarray(points)
+    features = compute_features(points, gray.shape)
+    out = np.empty((len(points), FEATURE_LENGTH), dtype=np.float64)
+    for i, name in enumerate(SCALAR_FEATURES):
+        out[:, i] = features[name]
+    start = len(SCALAR_FEATURES)
+    out[:, start:start + NUM_LANDMARKS * 2] = features['normalized']
+    for i, face in enumerate(points):
+        out[i, -HIST_BINS:] = eye_histogram(gray, face[LEFT_EYE])
+    return out
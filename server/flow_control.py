@@ -0,0 +1,84 @@
+"""
+Server-driven capture hints for /ws/video clients.
+
+Every session measures how long its frames take from arrival to answer,
+which already includes any wait for a busy detection backend. From that it
+picks one of a few capture levels (frame interval, max width, JPEG quality)
+and tells the client whenever the level changes, so an overloaded node
+degrades to fewer, smaller frames for everybody instead of building up
+latency.
+"""
+
+# (interval_ms, max_width, jpeg_quality), best quality first
+CAPTURE_LEVELS = [
+    (100, 640, 0.8),
+    (150, 480, 0.7),
+    (200, 320, 0.6),
+    (333, 320, 0.5),
+    (500, 240, 0.5),
+]
+
+
+class FlowController:
+    """Picks a capture level for one session from its frame latency"""
+
+    # Fraction of the frame interval a frame may use before we degrade
+    TARGET_UTILIZATION = 0.8
+    # Consecutive easy frames needed before stepping back up a level
+    UPGRADE_AFTER = 20
+    # Weight of the newest sample in the latency average
+    SMOOTHING = 0.2
+
+    def __init__(self):
+        self.level = 0
+        self.avg_ms = None
+        self.easy_frames = 0
+        self.sent_level = None
+
+    def record(self, seconds):
+        """Feed one frame's time from arrival to answer, queue waits included"""
+        ms = seconds * 1000.0
+        if self.avg_ms is None:
+            self.avg_ms = ms
+        else:
+            self.avg_ms += self.SMOOTHING * (ms - self.avg_ms)
+
+    def load_ms(self):
+        """Smoothed arrival-to-answer time; the backlog is already part of it"""
+        return self.avg_ms or 0.0
+
+    def update(self):
+        load = self.load_ms()
+        interval = CAPTURE_LEVELS[self.level][0]
+
+        if load > interval * self.TARGET_UTILIZATION:
+            # Degrade straight to the first level that has enough headroom
+            self.easy_frames = 0
+            while (self.level < len(CAPTURE_LEVELS) - 1 and
+                   load > CAPTURE_LEVELS[self.level][0] * self.TARGET_UTILIZATION):
+                self.level += 1
+        elif self.level > 0 and load < CAPTURE_LEVELS[self.level - 1][0] * self.TARGET_UTILIZATION / 2:
+            # Recover one level at a time, and only after a sustained quiet spell
+            self.easy_frames += 1
+            if self.easy_frames >= self.UPGRADE_AFTER:
+                self.level -= 1
+                self.easy_frames = 0
+        else:
+            self.easy_frames = 0
+
+    def hint(self):
+        """Return a flow message if the level differs from the last one sent, else None"""
+        self.update()
+        if self.level == self.sent_level:
+            return None
+        interval_ms, max_width, jpeg_quality = CAPTURE_LEVELS[self.level]
+        return {
+            'type': 'flow',
+            'interval_ms': interval_ms,
+            'max_width': max_width,
+            'jpeg_quality': jpeg_quality
+        }
+
+    def mark_sent(self):
+        """The last hint reached the client; until then hint() keeps offering it"""
+        self.sent_level = self.level
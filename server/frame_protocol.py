@@ -0,0 +1,127 @@
+"""
+Wire formats for the /ws/video WebSocket.
+
+Two framings are supported and a client may use either:
+
+json   (legacy) - text messages {"frame": "<base64 jpeg>"} answered with
+                  {"frame": "<base64 jpeg>", "status": ..., "play_alarm": ...}
+
+binary          - a client opts in by sending {"type": "hello", "protocol": "binary"}
+                  as its first text message; the server confirms with the
+                  protocol it will accept.
+
+                  request:  REQUEST_HEADER (seq, client_ts, flags) + raw JPEG bytes
+                  response: RESPONSE_HEADER (seq, client_ts, flags, meta_len)
+                            + meta_len bytes of UTF-8 JSON metadata
+                            + raw JPEG bytes (may be empty)
+
+The hello may also ask for "response": "metadata". The server then skips
+drawing and JPEG encoding and only returns the structured result (face
+boxes, eye landmarks, EAR, drowsy frame count, status, alarm flag); the
+client draws its own overlay on the live camera feed. The default
+"response": "frame" keeps returning the annotated JPEG.
+
+All header fields are big-endian. client_ts is whatever clock the client
+uses (milliseconds); the server only echoes it back.
+"""
+import base64
+import json
+import struct
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+PROTOCOL_JSON = 'json'
+PROTOCOL_BINARY = 'binary'
+PROTOCOLS = (PROTOCOL_JSON, PROTOCOL_BINARY)
+
+RESPONSE_FRAME = 'frame'
+RESPONSE_METADATA = 'metadata'
+RESPONSE_MODES = (RESPONSE_FRAME, RESPONSE_METADATA)
+
+# seq (uint32), client_ts (float64), flags (uint8)
+REQUEST_HEADER = struct.Struct('!IdB')
+# seq (uint32), client_ts (float64), flags (uint8), meta_len (uint32)
+RESPONSE_HEADER = struct.Struct('!IdBI')
+
+# Response flags
+FLAG_ALARM = 0x01
+
+FrameMessage = namedtuple('FrameMessage', 'seq client_ts flags image')
+
+
+def negotiate(hello):
+    """Answer a client's hello with the protocol and response mode the server will use"""
+    protocol = hello.get('protocol', PROTOCOL_JSON)
+    response = hello.get('response', RESPONSE_FRAME)
+    return {
+        'type': 'hello',
+        'protocol': protocol if protocol in PROTOCOLS else PROTOCOL_JSON,
+        'response': response if response in RESPONSE_MODES else RESPONSE_FRAME
+    }
+
+
+def _imdecode(jpeg):
+    """Decode JPEG bytes, raising ValueError instead of returning None or a cv2.error"""
+    if jpeg.size == 0:
+        raise ValueError("Empty JPEG payload")
+    image = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("JPEG could not be decoded")
+    return image
+
+
+def decode_binary_frame(data, timings=None):
+    """
+    Decode a binary request; the JPEG is read straight out of `data` without copying.
+
+    If a `timings` dict is given, the imdecode time is stored under 'decode'.
+    Raises ValueError for a truncated frame or a JPEG that does not decode.
+    """
+    if len(data) <= REQUEST_HEADER.size:
+        raise ValueError(f"Binary frame too short ({len(data)} bytes)")
+    seq, client_ts, flags = REQUEST_HEADER.unpack_from(data)
+    jpeg = np.frombuffer(data, np.uint8, offset=REQUEST_HEADER.size)
+    if timings is None:
+        return FrameMessage(seq, client_ts, flags, _imdecode(jpeg))
+    started = time.perf_counter()
+    image = _imdecode(jpeg)
+    timings['decode'] = time.perf_counter() - started
+    return FrameMessage(seq, client_ts, flags, image)
+
+
+def decode_json_frame(data, timings=None):
+    """Decode a legacy JSON request holding a base64 JPEG ('base64' and 'decode' timings)"""
+    if timings is None:
+        jpeg = np.frombuffer(base64.b64decode(data['frame']), np.uint8)
+        return FrameMessage(data.get('seq'), data.get('ts'), 0, _imdecode(jpeg))
+    started = time.perf_counter()
+    jpeg = np.frombuffer(base64.b64decode(data['frame']), np.uint8)
+    decoded = time.perf_counter()
+    image = _imdecode(jpeg)
+    timings['base64'] = decoded - started
+    timings['decode'] = time.perf_counter() - decoded
+    return FrameMessage(data.get('seq'), data.get('ts'), 0, image)
+
+
+def encode_binary_result(seq, client_ts, meta, jpeg=None, play_alarm=False):
+    """Build a binary response; `jpeg` may be any buffer such as cv2.imencode's output"""
+    meta_bytes = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+    flags = FLAG_ALARM if play_alarm else 0
+    header = RESPONSE_HEADER.pack(seq or 0, client_ts or 0.0, flags, len(meta_bytes))
+    parts = [header, meta_bytes]
+    if jpeg is not None:
+        parts.append(memoryview(jpeg).cast('B'))
+    return b''.join(parts)
+
+
+def encode_json_result(seq, meta, jpeg=None):
+    """Build a legacy JSON response"""
+    result = dict(meta)
+    if jpeg is not None:
+        result['frame'] = base64.b64encode(jpeg).decode('utf-8')
+    if seq is not None:
+        result['seq'] = seq
+    return result
@@ -0,0 +1,40 @@
+"""
+Latest-frame-wins mailbox between a WebSocket receiver task and its processor.
+
+When the server falls behind, queued frames only make alerts stale. The
+receiver puts every incoming frame here; a frame that has not been picked up
+yet is simply replaced by the newer one and counted as dropped.
+"""
+import asyncio
+
+
+class LatestFrameSlot:
+    """Single-slot mailbox: a new frame replaces any frame not yet taken"""
+
+    def __init__(self):
+        self._item = None
+        self._event = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, item):
+        if self._item is not None:
+            self.dropped += 1
+        self._item = item
+        self.received += 1
+        self._event.set()
+
+    def close(self):
+        """Wake the consumer; get() returns None once the slot is empty"""
+        self.closed = True
+        self._event.set()
+
+    async def get(self):
+        while self._item is None:
+            if self.closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        item, self._item = self._item, None
+        return item
@@ -0,0 +1,99 @@
+"""
+Cross-session micro-batching for the drowsiness model.
+
+Scoring one feature vector per frame per connection leaves the matrix
+multiplies mostly idle: a batch of 64 costs little more than a single row.
+InferenceBatcher collects the feature vectors every /ws/video session
+submits during a short window (BATCH_WINDOW_MS, default 5 ms) or until
+BATCH_MAX rows (default 64) are waiting, scores them in one call and hands
+each session its own rows back.
+
+Queue depth, batch size and time spent waiting are kept as histograms so the
+window can be tuned against p99 latency.
+"""
+import asyncio
+import os
+import time
+
+import numpy as np
+
+from metrics import Histogram
+
+
+class InferenceBatcher:
+    """Gathers feature vectors from all sessions and scores them together"""
+
+    SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+    WAIT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50)
+
+    def __init__(self, model, window_ms=None, max_batch=None):
+        self.model = model
+        if window_ms is None:
+            window_ms = float(os.getenv('BATCH_WINDOW_MS', '5'))
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch or int(os.getenv('BATCH_MAX', '64'))
+        # (features, future, enqueued at) per submitting session
+        self._queue = []
+        self._rows = 0
+        self._timer = None
+
+        self.queue_depth = Histogram(self.SIZE_BUCKETS)
+        self.batch_size = Histogram(self.SIZE_BUCKETS)
+        self.wait_ms = Histogram(self.WAIT_BUCKETS_MS)
+        self.batches = 0
+
+    async def score(self, features):
+        """Scores for the rows of `features` (one per face), once their batch has run"""
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim == 1:
+            features = features[None, :]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((features, future, time.perf_counter()))
+        self._rows += len(features)
+        self.queue_depth.observe(self._rows)
+
+        if self._rows >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        queue, self._queue, self._rows = self._queue, [], 0
+        if not queue:
+            return
+
+        batch = np.concatenate([features for features, _, _ in queue])
+        self.batch_size.observe(len(batch))
+        self.batches += 1
+        now = time.perf_counter()
+        try:
+            scores = self.model.predict(batch)
+        except Exception as e:
+            for _, future, _ in queue:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        start = 0
+        for features, future, enqueued in queue:
+            end = start + len(features)
+            self.wait_ms.observe((now - enqueued) * 1000.0)
+            # The session may have disconnected while waiting
+            if not future.done():
+                future.set_result(scores[start:end])
+            start = end
+
+    def stats(self):
+        return {
+            'window_ms': self.window * 1000.0,
+            'max_batch': self.max_batch,
+            'batches': self.batches,
+            'queue_depth': self.queue_depth.snapshot(),
+            'batch_size': self.batch_size.snapshot(),
+            'wait_ms': self.wait_ms.snapshot()
+        }
@@ -1,94 +1,274 @@
+import atexit
 import json
 import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+
+class _CollectionLog:
+    """
+    One collection stored as an append-only JSON Lines file.
+
+    Every create/update appends the full record as one line; the last line
+    for an id wins. An in-memory id index gives O(1) lookups, and lines
+    appended by other processes (uvicorn workers) are picked up by reading
+    the file tail before every access.
+    """
+
+    # fsync after this many appends, or when FSYNC_INTERVAL seconds have passed
+    FSYNC_EVERY = 16
+    FSYNC_INTERVAL = 1.0
+    # Compact once superseded lines outnumber live records by this factor
+    COMPACT_RATIO = 2
+    COMPACT_MIN_LINES = 1000
+
+    def __init__(self, path: str, legacy_path: str = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._records: Dict[str, Dict] = {}
+        self._offset = 0
+        self._inode = None
+        self._lines = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        if not os.path.exists(path):
+            self._create(legacy_path)
+
+    def _create(self, legacy_path):
+        """Create the log, importing records from the old whole-file JSON format"""
+        records = []
+        if legacy_path and os.path.exists(legacy_path):
+            try:
+                with open(legacy_path, 'r') as f:
+                    records = json.load(f)
+            except (ValueError, OSError):
+                records = []
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        # link() refuses to overwrite, so if another worker created it first, theirs wins
+        try:
+            os.link(tmp_path, self.path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+
+    @contextmanager
+    def _locked(self, exclusive):
+        """Open the log and lock it, retrying if another process swapped it out by compacting"""
+        while True:
+            f = open(self.path, 'ab+' if exclusive else 'rb')
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    yield f
+                    return
+            finally:
+                f.close()
+
+    def _apply_line(self, line: bytes):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return  # Torn write from a crash; it was followed by a newline on the next append
+        self._records[record.get('id')] = record
+        self._lines += 1
+
+    def _catch_up(self, f):
+        """Apply lines appended since our last read (by us or by other processes)"""
+        stat = os.fstat(f.fileno())
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # First read, or another process compacted the file: reload it
+            self._records = {}
+            self._offset = 0
+            self._lines = 0
+            self._inode = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        f.seek(self._offset)
+        data = f.read(stat.st_size - self._offset)
+        # Only consume complete lines
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].split(b'\n'):
+            self._apply_line(line)
+        self._offset += end
+
+    def read(self) -> Dict[str, Dict]:
+        with self._lock:
+            with self._locked(exclusive=False) as f:
+                self._catch_up(f)
+            return self._records
+
+    def append(self, record: Dict):
+        with self._lock:
+            with self._locked(exclusive=True) as f:
+                self._write(f, record)
+            self._maybe_compact()
+
+    def update(self, record_id: str, update_data: Dict):
+        """
+        Merge `update_data` into a record and append the result, or return None if there is no such record.
+
+        The read and the append happen under one exclusive lock, so an update
+        from another worker can never slip in between and be overwritten.
+        """
+        with self._lock:
+            with self._locked(exclusive=True) as f:
+                self._catch_up(f)
+                record = self._records.get(record_id)
+                if record is None:
+                    return None
+                record = dict(record)
+                record.update(update_data)
+                self._write(f, record)
+            self._maybe_compact()
+        return record
+
+    def _write(self, f, record: Dict):
+        """Append one record to the exclusively locked log `f`"""
+        line = (json.dumps(record, default=str) + '\n').encode('utf-8')
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            # A crash mid-write can leave a line without its newline
+            f.seek(size - 1)
+            if f.read(1) != b'\n':
+                line = b'\n' + line
+        f.write(line)
+        f.flush()
+        self._unsynced += 1
+        if (self._unsynced >= self.FSYNC_EVERY or
+                time.monotonic() - self._last_sync >= self.FSYNC_INTERVAL):
+            os.fsync(f.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+        self._catch_up(f)
+
+    def _maybe_compact(self):
+        if self._lines > self.COMPACT_MIN_LINES and self._lines > self.COMPACT_RATIO * len(self._records):
+            self.compact()
+
+    def sync(self):
+        with self._lock:
+            if self._unsynced:
+                with self._locked(exclusive=True) as f:
+                    os.fsync(f.fileno())
+                self._unsynced = 0
+                self._last_sync = time.monotonic()
+
+    def compact(self):
+        """Rewrite the log with one line per live record, atomically"""
+        with self._lock:
+            with self._locked(exclusive=True) as f:
+                self._catch_up(f)
+                tmp_path = f"{self.path}.{os.getpid()}.compact"
+                with open(tmp_path, 'wb') as out:
+                    for record in self._records.values():
+                        out.write((json.dumps(record, default=str) + '\n').encode('utf-8'))
+                    out.flush()
+                    os.fsync(out.fileno())
+                # Still holding the lock: writers that were waiting notice the swap and reopen
+                os.replace(tmp_path, self.path)
+                self._inode = None
+                self._unsynced = 0
+
 
 class LocalDataStore:
     """
-    Local JSON file-based data storage as fallback when PocketBase collections aren't available
+    Local append-only data storage as fallback when PocketBase collections aren't available
     """
-    
+
     def __init__(self, data_dir: str = "local_data"):
         self.data_dir = data_dir
         os.makedirs(data_dir, exist_ok=True)
-        
+
         # Initialize data files
         self.collections = {
-            'sos_alerts': 'sos_alerts.json',
-            'users': 'users.json', 
-            'taxis': 'taxis.json',
-            'sessions': 'sessions.json'
+            'sos_alerts': 'sos_alerts.jsonl',
+            'users': 'users.jsonl',
+            'taxis': 'taxis.jsonl',
+            'sessions': 'sessions.jsonl'
         }
-        
-        # Create empty files if they don't exist
+
+        # Open (and on first run migrate from the old .json files) every collection
+        self._logs = {}
         for collection, filename in self.collections.items():
             filepath = os.path.join(self.data_dir, filename)
-            if not os.path.exists(filepath):
-                with open(filepath, 'w') as f:
-                    json.dump([], f)
-    
-    def _load_collection(self, collection_name: str) -> List[Dict]:
-        """Load data from JSON file"""
-        filepath = os.path.join(self.data_dir, self.collections[collection_name])
-        try:
-            with open(filepath, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-    
-    def _save_collection(self, collection_name: str, data: List[Dict]):
-        """Save data to JSON file"""
-        filepath = os.path.join(self.data_dir, self.collections[collection_name])
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2, default=str)
-    
+            legacy_path = os.path.join(self.data_dir, filename[:-len('.jsonl')] + '.json')
+            self._logs[collection] = _CollectionLog(filepath, legacy_path)
+
+        atexit.register(self.flush)
+
+    def _new_id(self, collection_name: str) -> str:
+        """Unique across threads and worker processes"""
+        return f"{collection_name}_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}"
+
     def create_record(self, collection_name: str, record_data: Dict) -> Dict:
         """Create a new record in collection"""
-        data = self._load_collection(collection_name)
-        
-        # Generate simple ID
-        new_id = f"{collection_name}_{len(data) + 1}_{int(datetime.now().timestamp())}"
-        record_data['id'] = new_id
+        log = self._logs[collection_name]
+
+        record_data['id'] = self._new_id(collection_name)
         record_data['created'] = datetime.now().isoformat()
         record_data['updated'] = datetime.now().isoformat()
-        
-        data.append(record_data)
-        self._save_collection(collection_name, data)
-        
+
+        log.append(record_data)
+
         return record_data
-    
+
     def get_records(self, collection_name: str, filter_func=None) -> List[Dict]:
         """Get all records from collection with optional filter"""
-        data = self._load_collection(collection_name)
-        
+        data = [dict(record) for record in self._logs[collection_name].read().values()]
+
         if filter_func:
             return [record for record in data if filter_func(record)]
-        
+
         return data
-    
+
     def get_record(self, collection_name: str, record_id: str) -> Dict:
         """Get single record by ID"""
-        data = self._load_collection(collection_name)
-        
-        for record in data:
-            if record.get('id') == record_id:
-                return record
-        
+        record = self._logs[collection_name].read().get(record_id)
+
+        if record is not None:
+            return dict(record)
+
         raise Exception(f"Record {record_id} not found in {collection_name}")
-    
+
     def update_record(self, collection_name: str, record_id: str, update_data: Dict) -> Dict:
         """Update existing record"""
-        data = self._load_collection(collection_name)
-        
-        for i, record in enumerate(data):
-            if record.get('id') == record_id:
-                record.update(update_data)
-                record['updated'] = datetime.now().isoformat()
-                data[i] = record
-                self._save_collection(collection_name, data)
-                return record
-        
-        raise Exception(f"Record {record_id} not found in {collection_name}")
+        changes = dict(update_data, updated=datetime.now().isoformat())
+        record = self._logs[collection_name].update(record_id, changes)
+        if record is None:
+            raise Exception(f"Record {record_id} not found in {collection_name}")
+
+        return record
+
+    def compact(self, collection_name: str = None):
+        """Drop superseded lines from one collection's log, or from all of them"""
+        names = [collection_name] if collection_name else list(self._logs)
+        for name in names:
+            self._logs[name].compact()
+
+    def flush(self):
+        """fsync any appends still waiting for the batched fsync"""
+        for log in self._logs.values():
+            log.sync()
 
 # Global instance
-local_store = LocalDataStore()
\ No newline at end of file
+local_store = LocalDataStore()
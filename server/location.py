@@ -0,0 +1,146 @@
+"""
+Location lookups for SOS records.
+
+get_current_location() used to do an IP lookup and a Nominatim reverse
+geocode for every alert, although a server's location barely ever changes.
+LocationProvider caches the IP position for a TTL and memoizes reverse
+geocodes by rounded coordinates in a small LRU, so repeated alerts cost no
+network calls. Coordinates sent by the driver's browser take precedence over
+the server's IP position.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+ADDRESS_PENDING = 'Resolving address...'
+ADDRESS_UNAVAILABLE = 'Location unavailable'
+
+
+def parse_client_location(data):
+    """Validate a {"type": "location", "latitude": ..., "longitude": ...} message"""
+    try:
+        latitude = float(data['latitude'])
+        longitude = float(data['longitude'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        return None
+    location = {'latitude': latitude, 'longitude': longitude, 'source': 'client'}
+    if data.get('accuracy') is not None:
+        location['accuracy'] = data['accuracy']
+    return location
+
+
+class LocationProvider:
+    """IP position with a TTL cache plus an LRU memo of reverse geocodes"""
+
+    def __init__(self, ip_ttl=3600, memo_size=256, precision=3):
+        self.ip_ttl = ip_ttl
+        self.memo_size = memo_size
+        # 3 decimals is roughly 110 m, well inside what an address describes
+        self.precision = precision
+        self._lock = threading.Lock()
+        self._ip_location = None
+        self._ip_fetched_at = 0.0
+        self._addresses = OrderedDict()
+        self._geolocator = None
+        self.ip_lookups = 0
+        self.geocode_calls = 0
+        self.memo_hits = 0
+
+    def server_location(self):
+        """The server's IP position (latitude, longitude), cached for ip_ttl seconds"""
+        with self._lock:
+            if self._ip_location is not None and time.time() - self._ip_fetched_at < self.ip_ttl:
+                return self._ip_location
+
+        import geocoder
+        try:
+            print("🌍 Getting location via IP...")
+            self.ip_lookups += 1
+            g = geocoder.ip('me')
+            print(f"📍 IP Location: {g.latlng}")
+            if g.latlng and len(g.latlng) >= 2:
+                with self._lock:
+                    self._ip_location = (g.latlng[0], g.latlng[1])
+                    self._ip_fetched_at = time.time()
+        except Exception as e:
+            print(f"❌ Location service error: {e}")
+
+        # On failure keep serving the last good position rather than made-up coordinates
+        with self._lock:
+            return self._ip_location
+
+    def _key(self, latitude, longitude):
+        return (round(latitude, self.precision), round(longitude, self.precision))
+
+    def cached_address(self, latitude, longitude):
+        """Memoized address for these coordinates, or None without touching the network"""
+        key = self._key(latitude, longitude)
+        with self._lock:
+            address = self._addresses.get(key)
+            if address is not None:
+                self._addresses.move_to_end(key)
+                self.memo_hits += 1
+            return address
+
+    def reverse(self, latitude, longitude):
+        """Address for these coordinates, reverse geocoded at most once per rounded cell"""
+        address = self.cached_address(latitude, longitude)
+        if address is not None:
+            return address
+
+        from geopy.geocoders import Nominatim
+        try:
+            if self._geolocator is None:
+                self._geolocator = Nominatim(user_agent="drowsiness_detector")
+            self.geocode_calls += 1
+            location = self._geolocator.reverse(f"{latitude}, {longitude}")
+            address = location.address if location else 'Unknown location'
+        except Exception as e:
+            print(f"⚠️ Geocoding failed: {e}")
+            # Not memoized, so the next alert tries again
+            return ADDRESS_UNAVAILABLE
+
+        with self._lock:
+            self._addresses[self._key(latitude, longitude)] = address
+            while len(self._addresses) > self.memo_size:
+                self._addresses.popitem(last=False)
+        return address
+
+    def current_location(self):
+        """Server position with its address, resolved synchronously (for scripts and tests)"""
+        position = self.server_location()
+        if position is None:
+            return {'latitude': None, 'longitude': None, 'address': ADDRESS_UNAVAILABLE}
+        return {'latitude': position[0], 'longitude': position[1],
+                'address': self.reverse(position[0], position[1])}
+
+    def locate(self, payload):
+        """
+        Fill in latitude/longitude on an SOS payload without waiting on a geocoder.
+
+        The address is taken from the memo when possible, otherwise it is left
+        as ADDRESS_PENDING for resolve_address() once the alert is stored.
+        """
+        if payload.get('latitude') is None:
+            position = self.server_location()
+            if position is None:
+                payload.update({'latitude': None, 'longitude': None, 'address': ADDRESS_UNAVAILABLE})
+                return payload
+            payload['latitude'], payload['longitude'] = position
+        if not payload.get('address'):
+            payload['address'] = (self.cached_address(payload['latitude'], payload['longitude'])
+                                  or ADDRESS_PENDING)
+        return payload
+
+    def resolve_address(self, payload):
+        """Replace a pending address with a reverse geocode; True if the payload changed"""
+        if payload.get('address') != ADDRESS_PENDING:
+            return False
+        payload['address'] = self.reverse(payload['latitude'], payload['longitude'])
+        return True
+
+
+# Global instance
+location_provider = LocationProvider()
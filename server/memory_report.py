@@ -0,0 +1,81 @@
+"""
+Per-process memory breakdown for sizing worker counts.
+
+RSS counts every page a process maps, including pages it shares with its
+siblings, so adding up worker RSS overstates what one more worker costs.
+The number that matters is USS (unique set size: private pages only), with
+PSS (shared pages split evenly between the processes mapping them) as the
+fair share. Both come from /proc/<pid>/smaps_rollup, so this is Linux-only.
+
+Usage:
+    python memory_report.py 1234 1240 1241
+    python memory_report.py --children-of 1234
+"""
+import argparse
+import os
+
+
+def process_memory(pid):
+    """{'rss', 'pss', 'uss', 'shared'} in MB for one process, or None if unavailable"""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None
+    uss = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    shared = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    return {name: round(kb / 1024.0, 1) for name, kb in
+            (('rss', fields.get('Rss', 0)), ('pss', fields.get('Pss', 0)), ('uss', uss), ('shared', shared))}
+
+
+def child_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def format_report(pids, labels=None):
+    """Table of RSS/PSS/USS per process plus the totals that actually add up"""
+    labels = labels or {}
+    lines = [f"{'pid':>8}  {'role':<10}{'rss':>9}{'pss':>9}{'uss':>9}{'shared':>9}  (MB)"]
+    totals = {'rss': 0.0, 'pss': 0.0, 'uss': 0.0}
+    for pid in pids:
+        memory = process_memory(pid)
+        if memory is None:
+            lines.append(f"{pid:>8}  {labels.get(pid, ''):<10}  unavailable")
+            continue
+        for name in totals:
+            totals[name] += memory[name]
+        lines.append(f"{pid:>8}  {labels.get(pid, ''):<10}{memory['rss']:>9.1f}{memory['pss']:>9.1f}"
+                     f"{memory['uss']:>9.1f}{memory['shared']:>9.1f}")
+    lines.append(f"{'total':>8}  {'':<10}{totals['rss']:>9.1f}{totals['pss']:>9.1f}{totals['uss']:>9.1f}"
+                 f"   (PSS total is the real footprint)")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS, PSS and unique RSS (USS) per process")
+    parser.add_argument('pids', nargs='*', type=int)
+    parser.add_argument('--children-of', type=int, help="Report this process and its direct children")
+    args = parser.parse_args()
+
+    pids = list(args.pids)
+    labels = {}
+    if args.children_of:
+        labels[args.children_of] = 'parent'
+        children = child_pids(args.children_of)
+        labels.update({child: f"worker {i}" for i, child in enumerate(children)})
+        pids = [args.children_of] + children + pids
+    if not pids:
+        pids = [os.getpid()]
+    print(format_report(pids, labels))
+
+
+if __name__ == "__main__":
+    main()
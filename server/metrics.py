@@ -0,0 +1,145 @@
+"""
+In-process metrics for the frame path, exposed in Prometheus text format.
+
+Every stage of a frame (receive, base64, decode, grayscale, detect,
+landmarks or eyes, ear, model, annotate, encode, send) is observed into one
+histogram family, next to counters for sessions, frames, drops and SOS
+alerts. Both servers render REGISTRY on GET /metrics.
+
+Observing is a bisect and two additions, with no locks or allocations on
+the frame path. METRICS_ENABLED=0 switches it off: the WebSocket handlers
+skip their wire timings and every histogram and counter update, and
+/metrics answers 404. The detection stage still times itself (a few
+perf_counter calls per frame in analyze_frame and process_frame), because
+the benchmarks read those timings from the session.
+"""
+import bisect
+import os
+
+ENABLED = os.getenv('METRICS_ENABLED', '1') != '0'
+
+# Seconds; covers a sub-millisecond base64 decode up to a stalled detector
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """Counts of observations per bucket; `bounds` are inclusive upper edges"""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self):
+        buckets = {str(bound): count for bound, count in zip(self.bounds, self.counts)}
+        buckets['+Inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else None,
+            'buckets': buckets
+        }
+
+    def samples(self, name, labels=''):
+        """Prometheus lines: cumulative buckets, _sum and _count"""
+        prefix = f"{labels}," if labels else ''
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}'
+        suffix = f"{{{labels}}}" if labels else ''
+        yield f'{name}_sum{suffix} {self.total}'
+        yield f'{name}_count{suffix} {self.count}'
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name):
+        yield f'{name} {self.value}'
+
+
+class Gauge(Counter):
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class HistogramFamily:
+    """One Histogram per value of a single label, created on first use"""
+
+    def __init__(self, label, bounds):
+        self.label = label
+        self.bounds = bounds
+        self.children = {}
+
+    def labels(self, value):
+        child = self.children.get(value)
+        if child is None:
+            child = self.children[value] = Histogram(self.bounds)
+        return child
+
+    def observe_all(self, values):
+        """Observe a {label value: seconds} dict such as DrowsinessDetector.timings"""
+        for value, seconds in values.items():
+            self.labels(value).observe(seconds)
+
+    def samples(self, name):
+        for value, child in self.children.items():
+            yield from child.samples(name, f'{self.label}="{value}"')
+
+
+class Registry:
+    def __init__(self, namespace='drowsiness'):
+        self.namespace = namespace
+        self._metrics = []
+
+    def _add(self, name, help_text, kind, metric):
+        self._metrics.append((f"{self.namespace}_{name}", help_text, kind, metric))
+        return metric
+
+    def counter(self, name, help_text):
+        return self._add(name, help_text, 'counter', Counter())
+
+    def gauge(self, name, help_text):
+        return self._add(name, help_text, 'gauge', Gauge())
+
+    def histogram(self, name, help_text, bounds, label=None):
+        metric = HistogramFamily(label, bounds) if label else Histogram(bounds)
+        return self._add(name, help_text, 'histogram', metric)
+
+    def render(self):
+        lines = []
+        for name, help_text, kind, metric in self._metrics:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(metric.samples(name))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+ACTIVE_SESSIONS = REGISTRY.gauge('active_sessions', 'Open /ws/video connections')
+FRAMES_PROCESSED = REGISTRY.counter('frames_processed_total', 'Frames run through detection')
+FRAMES_DROPPED = REGISTRY.counter('frames_dropped_total', 'Frames replaced by a newer one before processing')
+FRAMES_INVALID = REGISTRY.counter('frames_invalid_total', 'Frames skipped because they could not be decoded')
+SOS_RAISED = REGISTRY.counter('sos_raised_total', 'SOS alerts queued')
+SOS_FAILURES = REGISTRY.counter('sos_failures_total', 'SOS alerts that could not be queued or delivered')
+STAGE_SECONDS = REGISTRY.histogram('stage_seconds', 'Time spent per frame stage', STAGE_BUCKETS, label='stage')
+FRAME_SECONDS = REGISTRY.histogram('frame_seconds', 'Time from picking up a frame to sending the answer',
+                                   STAGE_BUCKETS)
+
+# Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
@@ -0,0 +1,180 @@
+"""
+Process-wide PocketBase client with connection pooling and token reuse.
+
+Every DAO function used to build a fresh PocketBase object and log in again
+(sometimes twice: admin first, then the users collection) before doing its
+real work. PocketBaseClientManager keeps one client, and with it one pooled
+HTTP connection set, for the whole process. It authenticates once, refreshes
+the token shortly before it expires and only logs in again when PocketBase
+answers 401.
+"""
+import base64
+import json
+import os
+import threading
+import time
+
+import httpx
+from pocketbase import PocketBase
+from pocketbase.utils import ClientResponseError
+
+AUTH_NONE = 'none'
+AUTH_ADMIN = 'admin'
+AUTH_USER = 'user'
+
+
+def token_expiry(token):
+    """Return the `exp` claim of a JWT as a unix timestamp, or None"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+    except Exception:
+        return None
+
+
+class ManagedPocketBase(PocketBase):
+    """PocketBase client that logs in again once when a request comes back 401"""
+
+    AUTH_PATHS = ('/auth-with-password', '/auth-refresh')
+
+    def __init__(self, manager, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manager = manager
+
+    def send(self, path, req_config):
+        try:
+            return super().send(path, self._without_auth_header(req_config))
+        except ClientResponseError as e:
+            if e.status != 401 or path.endswith(self.AUTH_PATHS):
+                raise
+            self.manager.reauthenticate()
+            return super().send(path, self._without_auth_header(req_config))
+
+    @staticmethod
+    def _without_auth_header(req_config):
+        # The SDK writes the token into the headers dict it is given; hand it a
+        # fresh copy so a retry picks up the new token
+        config = dict(req_config)
+        headers = {k: v for k, v in config.get('headers', {}).items() if k != 'Authorization'}
+        if headers:
+            config['headers'] = headers
+        else:
+            config.pop('headers', None)
+        return config
+
+
+class PocketBaseClientManager:
+    """Owns the shared PocketBase client and its authentication state"""
+
+    # Refresh the token when it has less than this many seconds left
+    REFRESH_MARGIN = 300
+    # How long to run unauthenticated before trying the credentials again
+    LOGIN_RETRY = 60
+
+    def __init__(self, url=None, email=None, password=None, timeout=None):
+        # Anything not given is read from the environment on first use (after load_dotenv)
+        self.url = url
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self._lock = threading.RLock()
+        self._pb = None
+        self.auth_kind = None
+        self.expires_at = None
+        self._retry_login_at = None
+        # Logins a single fresh connect() needed (admin first, users second)
+        self._attempts_per_login = 0
+
+        self.connect_calls = 0
+        self.auth_calls = 0
+        self.refresh_calls = 0
+        self.reauth_on_401 = 0
+
+    def client(self):
+        """Return the shared, authenticated client"""
+        with self._lock:
+            self.connect_calls += 1
+            if self._pb is None:
+                self.url = self.url or os.getenv('POCKETBASE_URL')
+                self.email = self.email or os.getenv('POCKETBASE_ADMIN_EMAIL')
+                self.password = self.password or os.getenv('POCKETBASE_ADMIN_PASSWORD')
+                self.timeout = self.timeout or float(os.getenv('POCKETBASE_TIMEOUT', '15'))
+                print(f"🔗 Connecting to PocketBase: {self.url}")
+                http_client = httpx.Client(
+                    timeout=self.timeout,
+                    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10))
+                self._pb = ManagedPocketBase(self, self.url, timeout=self.timeout, http_client=http_client)
+            self._ensure_token()
+            return self._pb
+
+    def reauthenticate(self):
+        """Drop the current token and log in again (called on 401)"""
+        with self._lock:
+            self.reauth_on_401 += 1
+            self._pb.auth_store.clear()
+            self._login()
+
+    def _ensure_token(self):
+        if self.auth_kind is None:
+            self._login()
+        elif self.auth_kind == AUTH_NONE and self._retry_login_at is not None:
+            if time.time() >= self._retry_login_at:
+                self._login()
+        elif self.auth_kind != AUTH_NONE and self.expires_at is not None:
+            if self.expires_at - time.time() < self.REFRESH_MARGIN:
+                self._refresh()
+
+    def _login(self):
+        self.auth_kind = AUTH_NONE
+        self.expires_at = None
+        self._retry_login_at = None
+        self._attempts_per_login = 0
+        if not (self.email and self.password):
+            print("⚠️  No authentication successful, proceeding without auth")
+            return
+
+        # Try admin authentication first, then a regular user with the same credentials
+        for kind, auth in ((AUTH_ADMIN, self._pb.admins), (AUTH_USER, self._pb.collection('users'))):
+            self.auth_calls += 1
+            self._attempts_per_login += 1
+            try:
+                auth.auth_with_password(self.email, self.password)
+                self.auth_kind = kind
+                self.expires_at = token_expiry(self._pb.auth_store.token)
+                print(f"✅ {kind.capitalize()} authenticated successfully")
+                return
+            except Exception as e:
+                print(f"⚠️  {kind.capitalize()} authentication failed: {e}")
+
+        self._retry_login_at = time.time() + self.LOGIN_RETRY
+        print("⚠️  No authentication successful, proceeding without auth")
+
+    def _refresh(self):
+        self.refresh_calls += 1
+        try:
+            if self.auth_kind == AUTH_ADMIN:
+                self._pb.admins.authRefresh()
+            else:
+                self._pb.collection('users').authRefresh()
+            self.expires_at = token_expiry(self._pb.auth_store.token)
+        except Exception as e:
+            print(f"⚠️  Token refresh failed, logging in again: {e}")
+            self._login()
+
+    def stats(self):
+        """Counters, including how many logins reuse has saved versus one login per connect()"""
+        with self._lock:
+            would_have = self.connect_calls * max(1, self._attempts_per_login) if self.email and self.password else 0
+            return {
+                'connect_calls': self.connect_calls,
+                'auth_calls': self.auth_calls,
+                'refresh_calls': self.refresh_calls,
+                'reauth_on_401': self.reauth_on_401,
+                'auth_calls_saved': max(0, would_have - self.auth_calls - self.refresh_calls),
+                'auth_kind': self.auth_kind
+            }
+
+
+# Global instance
+client_manager = PocketBaseClientManager()
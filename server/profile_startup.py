@@ -0,0 +1,110 @@
+"""
+Cold-start profile of the server.
+
+Two numbers matter for a restart on Railway: how long until uvicorn accepts
+connections (import time of the app module) and how long until the detector
+is loaded and warmed up. This script measures both in fresh interpreters:
+
+- `python -X importtime` of the app module, summarised as total import time
+  and the packages that take longest to import;
+- a real uvicorn start on localhost, polling /health/live and /health/ready.
+
+Usage:
+    python profile_startup.py
+    python profile_startup.py --module simple_app --top 25 --no-serve
+    python profile_startup.py --output startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_profile(module):
+    """(total_ms, {root package: ms}) from -X importtime, self times summed per package"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SERVER_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"❌ import {module} failed:\n{result.stderr[-2000:]}")
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        # Self times never overlap, so per-package sums add up to the total
+        root = name.strip().split('.')[0]
+        packages[root] = packages.get(root, 0) + int(self_us)
+    total_us = sum(packages.values())
+    return total_us / 1000.0, {name: us / 1000.0 for name, us in packages.items()}
+
+
+def get_status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1.0) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def serve_profile(module, port, timeout=120.0):
+    """Seconds from spawning uvicorn until /health/live and /health/ready answer 200"""
+    env = dict(os.environ, SOS_ENABLED='0')
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', f'{module}:app', '--host', '127.0.0.1',
+         '--port', str(port), '--log-level', 'warning'],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    live = ready = None
+    try:
+        while time.perf_counter() - started < timeout and server.poll() is None:
+            if live is None and get_status(f"{base}/health/live") == 200:
+                live = time.perf_counter() - started
+            if live is not None and get_status(f"{base}/health/ready") == 200:
+                ready = time.perf_counter() - started
+                break
+            time.sleep(0.02)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    return {'live_s': round(live, 3) if live is not None else None,
+            'ready_s': round(ready, 3) if ready is not None else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time and time-to-ready profile of the server")
+    parser.add_argument('--module', default='driver_drowsiness')
+    parser.add_argument('--top', type=int, default=15, help="Slowest packages to list")
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--no-serve', action='store_true', help="Only profile the import")
+    parser.add_argument('--output', help="Write the JSON report here")
+    args = parser.parse_args()
+
+    total_ms, packages = import_profile(args.module)
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    print(f"📦 import {args.module}: {total_ms:.0f} ms")
+    for name, ms in slowest:
+        print(f"   {name:<40}{ms:>9.1f} ms")
+    report = {'module': args.module, 'import_ms': round(total_ms, 1),
+              'slowest_imports_ms': {name: round(ms, 1) for name, ms in slowest}}
+
+    if not args.no_serve:
+        report.update(serve_profile(args.module, args.port))
+        print(f"🚀 uvicorn live after {report['live_s']} s, ready after {report['ready_s']} s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
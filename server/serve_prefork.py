@@ -0,0 +1,112 @@
+"""
+Pre-fork server: load the models once, then fork the uvicorn workers.
+
+`uvicorn --workers N` starts every worker as a fresh interpreter, so each
+one loads its own copy of the 68-point landmark predictor and the Haar
+cascades and memory grows linearly with N. Here the parent process imports
+the app and builds DetectorModels first, binds the listening socket, and
+only then forks the workers. The model data sits in pages the workers
+never write to, so the kernel keeps one copy shared copy-on-write by all of
+them; each worker only adds what it allocates itself.
+
+The parent restarts workers that die and passes SIGINT/SIGTERM on to them.
+A per-worker RSS/PSS/USS table is printed once the workers have warmed up
+and again on SIGUSR1; USS (unique RSS) is what one more worker really costs.
+
+Linux/macOS only (needs os.fork).
+
+Usage:
+    python serve_prefork.py --workers 4 --port 8000
+    python serve_prefork.py --workers 4 --no-preload   # per-worker models, for comparison
+"""
+import argparse
+import os
+import signal
+import time
+
+import uvicorn
+
+from memory_report import format_report
+
+
+def run_worker(config, sock):
+    # The parent's handlers must not run in the worker; uvicorn installs its own
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    finally:
+        os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve driver_drowsiness with models shared across forked workers")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', '2')))
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '8000')))
+    parser.add_argument('--no-preload', action='store_true',
+                        help="Let every worker load its own models (the uvicorn --workers layout)")
+    parser.add_argument('--report-after', type=float, default=15.0,
+                        help="Seconds after start to print the memory table (0 to skip)")
+    args = parser.parse_args()
+
+    import driver_drowsiness
+    if not args.no_preload:
+        started = time.perf_counter()
+        models = driver_drowsiness.get_models()
+        print(f"📦 Models loaded once in the parent in {time.perf_counter() - started:.2f}s "
+              f"(landmarks: {models.use_advanced}, model: {models.model is not None})")
+
+    config = uvicorn.Config(driver_drowsiness.app, host=args.host, port=args.port)
+    sock = config.bind_socket()
+    workers = {}
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(config, sock)
+        workers[pid] = index
+        print(f"👷 Worker {index} started (pid {pid})")
+
+    def report(*_):
+        labels = {os.getpid(): 'parent'}
+        labels.update({pid: f"worker {index}" for pid, index in workers.items()})
+        print(format_report(list(labels), labels), flush=True)
+
+    def stop(signum, _):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    for index in range(args.workers):
+        spawn(index)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGUSR1, report)
+    if args.report_after > 0:
+        signal.signal(signal.SIGALRM, report)
+        signal.setitimer(signal.ITIMER_REAL, args.report_after)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = workers.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"⚠️ Worker {index} (pid {pid}) exited with status {status}, restarting")
+            spawn(index)
+    sock.close()
+    print("👋 All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
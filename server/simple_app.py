@@ -3,18 +3,19 @@ Simplified version for PythonAnywhere deployment
 This version removes some heavy dependencies that might not install on free tier
 """
 from fastapi import FastAPI, WebSocket
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 import cv2
 import numpy as np
 # import dlib  # Comment out if dlib fails to install
-from scipy.spatial import distance
 import asyncio
 import base64
 import os
+import time
 from datetime import datetime
 # from dao import raise_sos  # Comment out if PocketBase has issues
 import json
+import metrics
 
 app = FastAPI(title="Driver Drowsiness Detection", version="1.0.0")
 
@@ -90,8 +91,12 @@ class SimpleDrowsinessDetector:
                         # Try to raise SOS
                         try:
                             await self.raise_simple_sos()
+                            if metrics.ENABLED:
+                                metrics.SOS_RAISED.inc()
                         except:
                             print("SOS system unavailable")
+                            if metrics.ENABLED:
+                                metrics.SOS_FAILURES.inc()
                     else:
                         self.status = "Alert and Active"
                         self.color = (0, 255, 0)  # Green
@@ -226,35 +231,56 @@ async def main():
 async def video_feed(websocket: WebSocket):
     """Handle video WebSocket connections"""
     await websocket.accept()
+    if metrics.ENABLED:
+        metrics.ACTIVE_SESSIONS.inc()
     
     try:
         while True:
             data = await websocket.receive_json()
             
             if 'frame' in data:
+                started = time.perf_counter()
                 # Decode frame from base64
                 frame_data = base64.b64decode(data['frame'])
+                decoded = time.perf_counter()
                 nparr = np.frombuffer(frame_data, np.uint8)
                 frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
                 
                 if frame is not None:
                     # Process frame for drowsiness
+                    processing = time.perf_counter()
                     processed_frame, status, is_alert = await detector.process_frame(frame)
                     
                     # Encode processed frame
+                    encoding = time.perf_counter()
                     _, buffer = cv2.imencode('.jpg', processed_frame)
                     base64_frame = base64.b64encode(buffer).decode('utf-8')
                     
                     # Send response
+                    sending = time.perf_counter()
                     await websocket.send_json({
                         "frame": base64_frame,
                         "status": status,
                         "alert": is_alert
                     })
+
+                    if metrics.ENABLED:
+                        finished = time.perf_counter()
+                        metrics.STAGE_SECONDS.observe_all({
+                            'base64': decoded - started,
+                            'decode': processing - decoded,
+                            'process': encoding - processing,
+                            'encode': sending - encoding,
+                            'send': finished - sending
+                        })
+                        metrics.FRAME_SECONDS.observe(finished - started)
+                        metrics.FRAMES_PROCESSED.inc()
                 
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
+        if metrics.ENABLED:
+            metrics.ACTIVE_SESSIONS.dec()
         await websocket.close()
 
 @app.get("/health")
@@ -267,6 +293,13 @@ async def health_check():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage histograms and frame/session/SOS counters in Prometheus text format"""
+    if not metrics.ENABLED:
+        return Response(status_code=404)
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
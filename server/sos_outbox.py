@@ -0,0 +1,271 @@
+"""
+Durable outbox for SOS alerts.
+
+Raising an SOS from the video loop used to mean an IP lookup, a reverse
+geocode, PocketBase authentication and several HTTP calls, all while every
+driver's frames waited. Now the frame path only appends one row to a local
+SQLite database (WAL mode) and a background SosDispatcher delivers queued
+alerts to PocketBase with retries and exponential backoff.
+
+Every alert gets an idempotency key that doubles as its PocketBase record id,
+so a retry after a lost response can never create a second record.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import metrics
+
+
+def new_idempotency_key():
+    """15 lowercase alphanumerics, the format PocketBase accepts as a record id"""
+    return uuid.uuid4().hex[:15]
+
+
+class SosOutbox:
+    """SQLite-backed queue of SOS alerts waiting to be delivered"""
+
+    # Seconds a claimed batch stays invisible to other dispatchers
+    CLAIM_LEASE = 60
+
+    def __init__(self, path="local_data/sos_outbox.db"):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: a committed row survives a process crash, and appends stay cheap
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                created REAL NOT NULL,
+                delivered_at REAL,
+                delivered_to TEXT,
+                last_error TEXT
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS outbox_due ON outbox (delivered_at, next_attempt)")
+        self._listeners = []
+        # A SQLite connection must not be used across fork (serve_prefork.py, process backend)
+        self._inherited = []
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reopen)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+
+    def _reopen(self):
+        """In a forked child: a connection of our own; the parent's is kept open but never used"""
+        self._inherited.append(self._conn)
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    def enqueue(self, payload, key=None):
+        """Append one alert and return its idempotency key; this is all the frame path pays"""
+        key = key or new_idempotency_key()
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (idempotency_key, payload, next_attempt, created) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(payload, default=str), now, now))
+        for wake in self._listeners:
+            wake()
+        return key
+
+    def add_listener(self, wake):
+        """Register a callable invoked after every enqueue (used to wake the dispatcher)"""
+        self._listeners.append(wake)
+
+    def remove_listener(self, wake):
+        if wake in self._listeners:
+            self._listeners.remove(wake)
+
+    def claim(self, limit):
+        """Take up to `limit` due alerts, hiding them from other dispatchers for CLAIM_LEASE"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT idempotency_key, payload, attempts FROM outbox "
+                    "WHERE delivered_at IS NULL AND next_attempt <= ? ORDER BY id LIMIT ?",
+                    (now, limit)).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET next_attempt = ? WHERE idempotency_key = ?",
+                    [(now + self.CLAIM_LEASE, row[0]) for row in rows])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [(key, json.loads(payload), attempts) for key, payload, attempts in rows]
+
+    def mark_delivered(self, key, destination="pocketbase"):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET delivered_at = ?, delivered_to = ?, last_error = NULL "
+                "WHERE idempotency_key = ?", (time.time(), destination, key))
+
+    def mark_failed(self, key, error, attempts, retry_in):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE idempotency_key = ?",
+                (attempts, time.time() + retry_in, str(error)[:500], key))
+
+    def update_payload(self, key, payload):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET payload = ? WHERE idempotency_key = ?",
+                (json.dumps(payload, default=str), key))
+
+    def next_due(self):
+        """Timestamp of the earliest undelivered alert's next attempt, or None"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT MIN(next_attempt) FROM outbox WHERE delivered_at IS NULL").fetchone()[0]
+
+    def pending_count(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE delivered_at IS NULL").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SosDispatcher:
+    """Background task that drains the outbox into PocketBase"""
+
+    BATCH_SIZE = 20
+    POLL_INTERVAL = 5.0
+    # Retry backoff: BASE_DELAY * 2 ** attempts, capped at MAX_DELAY
+    BASE_DELAY = 2.0
+    MAX_DELAY = 300.0
+    # After this many failed attempts the alert is kept in local storage instead
+    MAX_ATTEMPTS = 8
+
+    def __init__(self, outbox):
+        self.outbox = outbox
+        self._wakeup = None
+        self._wake = None
+        self._task = None
+        self.delivered = 0
+        self.failed = 0
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        # enqueue() may run on any thread, so wake the dispatcher through the loop
+        self._wake = lambda: loop.call_soon_threadsafe(self._wakeup.set)
+        self.outbox.add_listener(self._wake)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.outbox.remove_listener(self._wake)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            try:
+                batch = await asyncio.to_thread(self.outbox.claim, self.BATCH_SIZE)
+                if batch:
+                    await asyncio.to_thread(self.deliver, batch)
+                    # More may be waiting; go again straight away
+                    if len(batch) == self.BATCH_SIZE:
+                        continue
+            except Exception as e:
+                print(f"❌ SOS dispatcher error: {e}")
+
+            self._wakeup.clear()
+            due = await asyncio.to_thread(self.outbox.next_due)
+            timeout = self.POLL_INTERVAL if due is None else min(self.POLL_INTERVAL, max(0.0, due - time.time()))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def deliver(self, batch):
+        """Deliver one claimed batch over a single PocketBase connection (runs in a thread)"""
+        from dao import deliver_sos_batch, update_sos_address
+        from local_storage import local_store
+        from location import location_provider
+
+        try:
+            for key, payload, _ in batch:
+                if payload.get('latitude') is None or not payload.get('address'):
+                    # Coordinates come from the driver or the cached IP position; the
+                    # address only if it is already memoized, never a blocking geocode
+                    location_provider.locate(payload)
+                    self.outbox.update_payload(key, payload)
+
+            results = deliver_sos_batch([(key, payload) for key, payload, _ in batch])
+        except Exception as e:
+            # The whole batch failed: every alert counts an attempt, backs off and
+            # ends up in local storage like a single failed record would
+            results = {key: str(e) for key, _, _ in batch}
+
+        for key, payload, attempts in batch:
+            error = results.get(key)
+            if error is None:
+                self.outbox.mark_delivered(key)
+                self.delivered += 1
+                print(f"✅ SOS alert {key} delivered to PocketBase")
+                # The alert is stored; now there is time for the reverse geocode
+                if location_provider.resolve_address(payload):
+                    try:
+                        update_sos_address(key, payload['address'])
+                        self.outbox.update_payload(key, payload)
+                    except Exception as e:
+                        print(f"⚠️ Could not update address of SOS alert {key}: {e}")
+                continue
+
+            attempts += 1
+            if metrics.ENABLED:
+                metrics.SOS_FAILURES.inc()
+            if attempts >= self.MAX_ATTEMPTS:
+                print(f"💾 SOS alert {key} undeliverable after {attempts} attempts, saving locally")
+                try:
+                    location_provider.resolve_address(payload)
+                    local_store.create_record('sos_alerts', dict(payload, outbox_key=key))
+                    self.outbox.mark_delivered(key, destination="local")
+                except Exception as local_error:
+                    print(f"❌ Local save also failed: {local_error}")
+                    self.outbox.mark_failed(key, local_error, attempts, self.MAX_DELAY)
+                self.failed += 1
+                continue
+
+            retry_in = min(self.MAX_DELAY, self.BASE_DELAY * 2 ** attempts)
+            print(f"⚠️ SOS alert {key} delivery failed (attempt {attempts}), retrying in {retry_in:.0f}s: {error}")
+            self.outbox.mark_failed(key, error, attempts, retry_in)
+
+
+def sos_payload(details='Driver detected sleeping/drowsy. Immediate attention required.', **fields):
+    """The SOS record as queued by the frame path; location is filled in on delivery"""
+    now = datetime.now().isoformat()
+    payload = {
+        'taxiid': '',  # Will be set when user logs in
+        'driverid': '',  # Will be set when user logs in
+        'details': details,
+        'status': 'NEW',
+        'createdtime': now,
+        'actionedtime': now
+    }
+    payload.update(fields)
+    return payload
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import detection
+from detection import DLIB_AVAILABLE, DetectorModels
+
+
+@pytest.fixture(scope='module')
+def haar():
+    return DetectorModels(use_dlib=False, detect_scale=2, cascade_profile='balanced')
+
+
+@pytest.fixture(scope='module')
+def dlib_models():
+    if not DLIB_AVAILABLE:
+        pytest.skip("dlib is not installed")
+    return DetectorModels(use_dlib=True, detect_scale=2)
+
+
+def test_dlib_does_not_downscale_480p_by_default(dlib_models):
+    assert dlib_models.detection_scale(480) == 1.0
+
+
+def test_dlib_downscales_larger_frames(dlib_models):
+    assert dlib_models.detection_scale(720) == pytest.approx(1.35)
+    assert dlib_models.detection_scale(1080) == 2.0
+
+
+def test_dlib_downscales_480p_with_a_closer_camera(dlib_models):
+    configured = dlib_models.min_face
+    dlib_models.min_face = 0.34
+    try:
+        assert dlib_models.detection_scale(480) == 2.0
+    finally:
+        dlib_models.min_face = configured
+
+
+def test_haar_downscales_480p(haar):
+    assert haar.detection_scale(480) == 2.0
+
+
+def test_overlapping_reuse_windows_do_not_count_one_eye_twice(haar, monkeypatch):
+    eye = (110, 100, 40, 40)
+
+    def find_eyes(models, gray, region, face_width):
+        rx, ry, rw, rh = region
+        inside = rx <= eye[0] and ry <= eye[1] and eye[0] + eye[2] <= rx + rw and eye[1] + eye[3] <= ry + rh
+        return [eye] if inside else []
+
+    monkeypatch.setattr(detection, '_find_eyes', find_eyes)
+    gray = np.zeros((480, 640), dtype=np.uint8)
+    face = (60, 40, 200, 200)
+    previous = (face, [(100, 100, 40, 40), (120, 100, 40, 40)], 0)
+    eyes, reused = detection.detect_eyes(haar, gray, face, previous)
+    assert eyes == [eye]
+    assert not reused
+
+
+def test_reuse_keeps_each_eye_in_its_own_window(haar, monkeypatch):
+    left, right = (100, 100, 40, 40), (180, 100, 40, 40)
+    monkeypatch.setattr(detection, '_find_eyes', lambda models, gray, region, face_width: [left, right])
+    gray = np.zeros((480, 640), dtype=np.uint8)
+    face = (60, 40, 200, 200)
+    eyes, reused = detection.detect_eyes(haar, gray, face, (face, [left, right], 0))
+    assert eyes == [left, right]
+    assert reused
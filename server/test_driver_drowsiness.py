@@ -0,0 +1,16 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import driver_drowsiness
+
+
+def test_session_closes_when_detector_fails(monkeypatch):
+    async def failed():
+        raise RuntimeError("models missing")
+    monkeypatch.setattr(driver_drowsiness, 'detector_ready', failed)
+    client = TestClient(driver_drowsiness.app)
+    with client.websocket_connect('/ws/video') as ws:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 1011
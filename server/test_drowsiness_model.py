@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from drowsiness_model import NumpyMLP
+from export_model import fold_layers
+
+
+def dense(activation, inputs=3, outputs=1):
+    return {'type': 'dense', 'W': np.ones((inputs, outputs)), 'b': np.zeros(outputs), 'activation': activation}
+
+
+@pytest.mark.parametrize('activation', ['tanh', 'softmax', 'elu'])
+def test_unsupported_activation_is_rejected(activation):
+    with pytest.raises(ValueError):
+        fold_layers([dense(activation)])
+    with pytest.raises(ValueError):
+        NumpyMLP([np.ones((3, 1))], [np.zeros(1)], [activation])
+
+
+def test_supported_chain_predicts_probabilities():
+    model = NumpyMLP(*fold_layers([dense('relu', 3, 2), dense('sigmoid', 2, 1)]))
+    scores = model.predict(np.ones((4, 3)))
+    assert scores.shape == (4,)
+    assert np.all((scores > 0) & (scores < 1))
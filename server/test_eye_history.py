@@ -0,0 +1,76 @@
+from eye_history import MAX_GAP_S, EyeHistory
+
+
+def test_stalled_connection_is_not_a_long_closure():
+    """Two closed frames 5 s apart count as at most MAX_GAP_S of closure"""
+    history = EyeHistory()
+    history.push(100.0, 0.1, False)
+    history.push(105.0, 0.1, False)
+    assert history.closed_for() == MAX_GAP_S
+    assert history.longest_closure() == MAX_GAP_S
+
+    history.push(105.1, 0.3, True)
+    assert history.closed_for() == 0.0
+    assert abs(history.longest_closure() - (MAX_GAP_S + 0.1)) < 1e-9
+
+
+def test_closure_follows_frame_times():
+    history = EyeHistory()
+    for i in range(10):
+        history.push(i * 0.1, 0.1, False)
+    assert abs(history.closed_for() - 0.9) < 1e-9
+    history.push(1.0, 0.3, True)
+    assert abs(history.longest_closure() - 1.0) < 1e-9
+    assert abs(history.perclos() - 0.9) < 1e-9
+
+
+def replay(history, states, step=0.1, start=0.0):
+    """Push one sample per `step` seconds; states are True for open eyes"""
+    for i, eyes_open in enumerate(states):
+        history.push(start + i * step, 0.3 if eyes_open else 0.1, eyes_open)
+    return start + len(states) * step
+
+
+def test_blink_rate_counts_short_closures_only():
+    history = EyeHistory(window_s=60)
+    # Five 0.2 s blinks and one 1 s closure over 12 s
+    states = ([True] * 18 + [False] * 2) * 5 + [True] * 10 + [False] * 10
+    replay(history, states + [True])
+    assert abs(history.span() - 12.0) < 1e-6
+    assert abs(history.blink_rate() - 5 * 60.0 / 12.0) < 1e-6
+    assert abs(history.longest_closure() - 1.0) < 1e-9
+
+
+def test_window_rollover_forgets_old_closures():
+    history = EyeHistory(window_s=5)
+    end = replay(history, [False] * 20 + [True])
+    assert history.perclos() > 0.9
+    assert abs(history.longest_closure() - 2.0) < 1e-9
+    replay(history, [True] * 60, start=end)
+    # The oldest kept sample still accounts for the step before it
+    assert history.span() <= 5.0 + 0.1 + 1e-9
+    assert history.perclos() < 1e-9
+    assert history.longest_closure() == 0.0
+    assert history.blink_rate() == 0.0
+
+
+def test_capacity_rollover_keeps_the_newest_samples():
+    history = EyeHistory(window_s=60, capacity=8)
+    replay(history, [False] * 10 + [True] * 10)
+    assert history.size == 8
+    assert abs(history.span() - 0.8) < 1e-9
+    assert history.perclos() < 1e-9
+
+
+def test_closure_duration_and_interrupt():
+    history = EyeHistory()
+    replay(history, [True] * 5)
+    assert history.closed_for() == 0.0
+    end = replay(history, [False] * 4, start=0.5)
+    assert abs(history.closed_for() - 0.3) < 1e-9
+    # No face: the closure in progress ends without becoming a blink or a closure
+    history.interrupt()
+    assert history.closed_for() == 0.0
+    replay(history, [False] * 3, start=end + 2.0)
+    assert abs(history.closed_for() - 0.2) < 1e-9
+    assert len(history.blinks) == 0
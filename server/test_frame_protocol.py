@@ -0,0 +1,42 @@
+import base64
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import driver_drowsiness
+from frame_protocol import REQUEST_HEADER, decode_binary_frame, decode_json_frame
+
+
+def sample_jpeg():
+    frame = np.full((120, 160, 3), 128, dtype=np.uint8)
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+@pytest.mark.parametrize('data', [{'frame': '!!!'}, {'frame': ''}, {'frame': base64.b64encode(b'junk').decode()}])
+def test_json_frame_without_jpeg_is_rejected(data):
+    with pytest.raises(ValueError):
+        decode_json_frame(data)
+    with pytest.raises(ValueError):
+        decode_json_frame(data, {})
+
+
+@pytest.mark.parametrize('data', [b'\x00\x01', REQUEST_HEADER.pack(1, 0.0, 0) + b'junk'])
+def test_binary_frame_without_jpeg_is_rejected(data):
+    with pytest.raises(ValueError):
+        decode_binary_frame(data)
+
+
+def test_bad_frames_do_not_end_the_session():
+    client = TestClient(driver_drowsiness.app)
+    with client.websocket_connect('/ws/video') as ws:
+        ws.send_json({'type': 'hello', 'protocol': 'binary', 'response': 'metadata'})
+        assert ws.receive_json()['type'] == 'hello'
+        ws.send_json({'frame': '!!!'})
+        ws.send_text('5')
+        ws.send_text('[]')
+        ws.send_text('{not json')
+        ws.send_bytes(b'\x00\x01')
+        ws.send_json({'frame': base64.b64encode(sample_jpeg()).decode(), 'seq': 42})
+        assert ws.receive_json()['seq'] == 42
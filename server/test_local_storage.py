@@ -0,0 +1,39 @@
+import multiprocessing
+
+from local_storage import LocalDataStore
+
+
+def update_many(data_dir, record_id, field, count, start):
+    store = LocalDataStore(data_dir)
+    start.wait()
+    for i in range(count):
+        store.update_record('sos_alerts', record_id, {field: i})
+
+
+def test_concurrent_updates_from_processes_are_not_lost(tmp_path):
+    store = LocalDataStore(str(tmp_path))
+    record_id = store.create_record('sos_alerts', {'status': 'NEW'})['id']
+    context = multiprocessing.get_context('fork')
+    start = context.Event()
+    workers = [context.Process(target=update_many, args=(str(tmp_path), record_id, f'field{i}', 300, start))
+               for i in range(4)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    record = LocalDataStore(str(tmp_path)).get_record('sos_alerts', record_id)
+    assert [record[f'field{i}'] for i in range(4)] == [299] * 4
+    assert record['status'] == 'NEW'
+
+
+def test_update_of_missing_record_raises(tmp_path):
+    store = LocalDataStore(str(tmp_path))
+    try:
+        store.update_record('sos_alerts', 'missing', {'status': 'DONE'})
+    except Exception as e:
+        assert 'missing' in str(e)
+    else:
+        raise AssertionError("update_record accepted a missing record")
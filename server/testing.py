@@ -2,12 +2,13 @@ import cv2
 import dlib
 import numpy as np
 import pytest
-from scipy.spatial import distance
 import time
 from tensorflow.keras.models import load_model
 import pygame
 from tensorflow.keras.optimizers.legacy import Adam
 
+from features import LEFT_EYE, RIGHT_EYE, calculate_ear, compute_features, landmarks_array
+
 class DrowsinessTest:
     def __init__(self):
         self.detector = dlib.get_frontal_face_detector()
@@ -17,13 +18,6 @@ class DrowsinessTest:
         pygame.mixer.init()
         self.alarm_sound = pygame.mixer.Sound("/Users/nekonyo/ai_project/Driver_Drowsy_Master/server/static/alarm.wav")
         
-    def calculate_ear(self, eye_points):
-        A = distance.euclidean(eye_points[1], eye_points[5])
-        B = distance.euclidean(eye_points[2], eye_points[4])
-        C = distance.euclidean(eye_points[0], eye_points[3])
-        ear = (A + B) / (2.0 * C)
-        return ear
-    
     def run_live_test(self):
         cap = cv2.VideoCapture(0)
         EYE_AR_THRESH = 0.25
@@ -42,16 +36,13 @@ class DrowsinessTest:
             status = "Status: Active"
             status_color = (0, 255, 0)  # Green for active
             
-            for face in faces:
-                landmarks = self.predictor(gray, face)
-                landmarks = np.array([[p.x, p.y] for p in landmarks.parts()])
-                
-                left_eye = landmarks[36:42]
-                right_eye = landmarks[42:48]
-                
-                left_ear = self.calculate_ear(left_eye)
-                right_ear = self.calculate_ear(right_eye)
-                ear = (left_ear + right_ear) / 2.0
+            shapes = [self.predictor(gray, face) for face in faces]
+            points = landmarks_array(shapes)
+            ears = compute_features(points, gray.shape)['ear'] if shapes else []
+            
+            for landmarks, ear in zip(points, ears):
+                left_eye = landmarks[LEFT_EYE]
+                right_eye = landmarks[RIGHT_EYE]
                 
                 left_hull = cv2.convexHull(left_eye)
                 right_hull = cv2.convexHull(right_eye)
@@ -88,12 +79,11 @@ class DrowsinessTest:
 
 # Unit Tests
 def test_ear_calculation():
-    detector = DrowsinessTest()
     eye_points = np.array([
         [0, 0], [1, 1], [2, 1],
         [3, 0], [2, -1], [1, -1]
     ])
-    ear = detector.calculate_ear(eye_points)
+    ear = calculate_ear(eye_points)
     assert ear > 0
     assert isinstance(ear, float)
 
@@ -1,5 +1,6 @@
+import argparse
+import math
 import os
-import cv2
 import dlib
 import numpy as np
 from tensorflow.keras.models import Sequential
@@ -9,7 +10,9 @@ from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau, ModelCh
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 import pickle
-from scipy.spatial import distance
+
+from dataset_features import (build_dataset, extract_image_features, fit_scaler,
+                              stream_batches, stream_eval_batches)
 
 class DrowsinessDetector:
     def __init__(self):
@@ -17,98 +20,25 @@ class DrowsinessDetector:
         self.predictor = dlib.shape_predictor("shape_predictor_68_face_landmarks.dat")
         self.scaler = StandardScaler()
         
-    def calculate_ear(self, eye_points):
-        A = distance.euclidean(eye_points[1], eye_points[5])
-        B = distance.euclidean(eye_points[2], eye_points[4])
-        C = distance.euclidean(eye_points[0], eye_points[3])
-        ear = (A + B) / (2.0 * C)
-        return ear
-    
-    def calculate_mouth_aspect_ratio(self, mouth_points):
-        A = distance.euclidean(mouth_points[2], mouth_points[10])
-        B = distance.euclidean(mouth_points[4], mouth_points[8])
-        C = distance.euclidean(mouth_points[0], mouth_points[6])
-        mar = (A + B) / (2.0 * C)
-        return mar
-    
     def extract_features(self, image_path):
         try:
-            img = cv2.imread(image_path)
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            faces = self.detector(gray)
-            
-            if len(faces) == 0:
-                return None
-                
-            face = faces[0]
-            landmarks = self.predictor(gray, face)
-            points = np.array([[p.x, p.y] for p in landmarks.parts()])
-            
-            # Extract facial features
-            left_eye = points[36:42]
-            right_eye = points[42:48]
-            mouth = points[48:68]
-            
-            # Calculate ratios
-            left_ear = self.calculate_ear(left_eye)
-            right_ear = self.calculate_ear(right_eye)
-            mar = self.calculate_mouth_aspect_ratio(mouth)
-            
-            # Calculate eye aspect ratio variance
-            ear_var = np.var([left_ear, right_ear])
-            
-            # Extract head pose features
-            nose_bridge = points[27:31]
-            nose_tip = points[31:36]
-            
-            # Calculate angles
-            nose_angle = np.arctan2(nose_tip[-1][1] - nose_bridge[0][1],
-                                  nose_tip[-1][0] - nose_bridge[0][0])
-            
-            features = []
-            features.extend([left_ear, right_ear, mar, ear_var, nose_angle])
-            
-            # Add normalized landmark positions
-            for point in points:
-                features.extend([point[0]/img.shape[1], point[1]/img.shape[0]])
-            
-            # Add histogram features
-            eye_region = gray[min(left_eye[:,1]):max(left_eye[:,1]),
-                            min(left_eye[:,0]):max(left_eye[:,0])]
-            if eye_region.size > 0:
-                hist = cv2.calcHist([eye_region], [0], None, [8], [0, 256])
-                features.extend(hist.flatten())
-                
-            return np.array(features)
+            # Same feature kernel as the live server (features.py)
+            return extract_image_features(self.detector, self.predictor, image_path)
             
         except Exception as e:
             print(f"Error processing {image_path}: {str(e)}")
             return None
     
-    def prepare_dataset(self):
-        dataset_dir = '/Users/nekonyo/ai_project/Driver_Drowsy_Master/server/dataset'
-        X = []
-        y = []
-        
-        # Process images with data augmentation
-        for class_name, label in [('Drowsy', 1), ('Non Drowsy', 0)]:
-            class_dir = os.path.join(dataset_dir, class_name)
-            for img_name in os.listdir(class_dir):
-                if img_name.endswith(('.jpg', '.jpeg', '.png')):
-                    img_path = os.path.join(class_dir, img_name)
-                    features = self.extract_features(img_path)
-                    if features is not None:
-                        X.append(features)
-                        y.append(label)
-                        
-                        # Add augmented samples for minority class
-                        if label == 1:  # Drowsy class
-                            features_aug = features + np.random.normal(0, 0.01, features.shape)
-                            X.append(features_aug)
-                            y.append(label)
-        
-        X = np.array(X)
-        y = np.array(y)
+    def prepare_dataset(self, dataset_dir='dataset', workers=None, cache_dir=None):
+        # Parallel extraction; unchanged images come straight from the feature cache
+        features_path, labels_path = build_dataset(dataset_dir, cache_dir, workers)
+        X = np.load(features_path, mmap_mode='r').astype(np.float64)
+        y = np.load(labels_path, mmap_mode='r').astype(np.int64)
+        
+        # Add augmented samples for minority class
+        drowsy = X[y == 1]
+        X = np.concatenate([X, drowsy + np.random.normal(0, 0.01, drowsy.shape)])
+        y = np.concatenate([y, np.ones(len(drowsy), dtype=y.dtype)])
         
         # Normalize features
         X = self.scaler.fit_transform(X)
@@ -148,16 +78,11 @@ class DrowsinessDetector:
         
         return model
     
-    def train_model(self):
-        X, y = self.prepare_dataset()
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42, stratify=y)
-        
-        model = self.create_model(X_train.shape[1])
-        
+    def create_callbacks(self):
         if not os.path.exists('models'):
             os.makedirs('models')
             
-        callbacks = [
+        return [
             ModelCheckpoint(
                 'models/best_model.dat',
                 monitor='val_accuracy',
@@ -178,31 +103,84 @@ class DrowsinessDetector:
                 mode='max'
             )
         ]
+    
+    def save_model(self, model, history, feature_shape):
+        model_data = {
+            'model': model,
+            'history': history.history,
+            'feature_shape': feature_shape,
+            'scaler': self.scaler
+        }
+        
+        with open('models/drowsiness_detector.keras', 'wb') as f:
+            pickle.dump(model_data, f)
+    
+    def train_model(self, dataset_dir='dataset', workers=None, cache_dir=None):
+        X, y = self.prepare_dataset(dataset_dir, workers, cache_dir)
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42, stratify=y)
+        
+        model = self.create_model(X_train.shape[1])
         
         history = model.fit(
             X_train, y_train,
             validation_data=(X_test, y_test),
             epochs=100,
             batch_size=32,
-            callbacks=callbacks,
+            callbacks=self.create_callbacks(),
             class_weight={0: 1.0, 1: 1.5}  # Give more weight to drowsy class
         )
         
-        model_data = {
-            'model': model,
-            'history': history.history,
-            'feature_shape': X_train.shape[1],
-            'scaler': self.scaler
-        }
+        self.save_model(model, history, X_train.shape[1])
         
-        with open('models/drowsiness_detector.keras', 'wb') as f:
-            pickle.dump(model_data, f)
+        return model, history
+    
+    def train_model_streaming(self, dataset_dir='dataset', workers=None, cache_dir=None, batch_size=32):
+        """Train from the memory-mapped feature table; memory stays flat however large it is"""
+        features_path, labels_path = build_dataset(dataset_dir, cache_dir, workers)
+        labels = np.load(labels_path, mmap_mode='r')
+        feature_shape = np.load(features_path, mmap_mode='r').shape[1]
+        
+        # Only the int8 labels are needed to split
+        indices = np.arange(len(labels))
+        train_idx, test_idx = train_test_split(indices, test_size=0.3, random_state=42,
+                                               stratify=np.asarray(labels))
+        
+        # Scaler statistics from the training rows, one chunk at a time
+        fit_scaler(self.scaler, features_path, train_idx)
+        
+        model = self.create_model(feature_shape)
+        
+        # Batches are class balanced, so no class_weight here
+        history = model.fit(
+            stream_batches(features_path, labels_path, train_idx, self.scaler, batch_size),
+            steps_per_epoch=math.ceil(len(train_idx) / batch_size),
+            validation_data=stream_eval_batches(features_path, labels_path, test_idx, self.scaler),
+            validation_steps=math.ceil(len(test_idx) / 256),
+            epochs=100,
+            callbacks=self.create_callbacks()
+        )
+        
+        self.save_model(model, history, feature_shape)
         
         return model, history
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the drowsiness MLP")
+    parser.add_argument('--dataset', default=os.getenv('DATASET_DIR', 'dataset'),
+                        help="Directory holding 'Drowsy' and 'Non Drowsy' image folders")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Feature extraction processes (default: one per CPU)")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Feature cache directory (default: <dataset>/.feature_cache)")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream batches from the memory-mapped cache instead of loading the whole set")
+    args = parser.parse_args()
+
     detector = DrowsinessDetector()
-    model, history = detector.train_model()
+    if args.stream:
+        model, history = detector.train_model_streaming(args.dataset, args.workers, args.cache_dir)
+    else:
+        model, history = detector.train_model(args.dataset, args.workers, args.cache_dir)
     
     print(f"Final training accuracy: {history.history['accuracy'][-1]:.2f}")
     print(f"Final validation accuracy: {history.history['val_accuracy'][-1]:.2f}")